@@ -19,6 +19,10 @@ Distribution Agent:
 - Optimize writer prompt to create longer and more enjoyeable blogs
 - Use Local Models like Storywriter
 """
+import asyncio
+import os
+import sys
+
 from termcolor import colored
 from swarms.models import OpenAIChat
 from swarms.prompts.autoblogen import (
@@ -27,7 +31,6 @@ from swarms.prompts.autoblogen import (
     SOCIAL_MEDIA_SYSTEM_PROMPT_AGENT,
     TOPIC_GENERATOR,
 )
-import os
 
 api_key = os.environ["OPENAI_API_KEY"]
 llm = OpenAIChat(openai_api_key=api_key)
@@ -45,83 +48,45 @@ def social_media_prompt(article: str, goal: str = "Clicks and engagement"):
     return prompt
 
 
-# Agent that generates topics
-topic_selection_task = (
-    "Generate 10 topics on gaining mental clarity using ancient practices"
-)
-topics = llm(
-    f"Your System Instructions: {TOPIC_GENERATOR}, Your current task: {topic_selection_task}"
-)
-
-dashboard = print(
-    colored(
-        f"""
-    Topic Selection Agent
-    -----------------------------
-
-    Topics:
-    ------------------------
-    {topics}
-    
-    """,
-        "blue",
+def banner(title: str, heading: str, body: str, color: str):
+    """Write an agent's output under a title, only colorizing for terminals"""
+    text = "".join(
+        (
+            "\n------------------------------------\n",
+            title,
+            "\n-----------------------------\n\n",
+            heading,
+            ":\n------------------------\n",
+            body,
+            "\n\n",
+        )
     )
-)
+    sys.stdout.write(colored(text, color) if sys.stdout.isatty() else text)
 
 
-draft_blog = llm(DRAFT_AGENT_SYSTEM_PROMPT)
-draft_out = print(
-    colored(
-        f"""
-    
-    ------------------------------------
-    Drafter Writer Agent
-    -----------------------------
-
-    Draft:
-    ------------------------
-    {draft_blog}
-    
-    """,
-        "red",
+async def main():
+    # The draft does not depend on the topics, so both agents run together
+    topic_selection_task = (
+        "Generate 10 topics on gaining mental clarity using ancient practices"
     )
-)
-
-
-# Agent that reviews the draft
-review_agent = llm(get_review_prompt(draft_blog))
-reviewed_draft = print(
-    colored(
-        f"""
-    
-    ------------------------------------
-    Quality Assurance Writer Agent
-    -----------------------------
-
-    Complete Narrative:
-    ------------------------
-    {draft_blog}
-    
-    """,
-        "blue",
+    topics, draft_blog = await asyncio.gather(
+        llm.apredict(
+            f"Your System Instructions: {TOPIC_GENERATOR}, Your current task: {topic_selection_task}"
+        ),
+        llm.apredict(DRAFT_AGENT_SYSTEM_PROMPT),
     )
-)
-
+    banner("Topic Selection Agent", "Topics", topics, "blue")
+    banner("Drafter Writer Agent", "Draft", draft_blog, "red")
 
-# Agent that publishes on social media
-distribution_agent = llm(social_media_prompt(draft_blog, goal="Clicks and engagement"))
-distribution_agent_out = print(
-    colored(
-        f"""
-        --------------------------------
-        Distribution Agent
-        -------------------
+    # The review and distribution agents both only consume the draft
+    review_agent, distribution_agent = await asyncio.gather(
+        llm.apredict(get_review_prompt(draft_blog)),
+        llm.apredict(social_media_prompt(draft_blog, goal="Clicks and engagement")),
+    )
+    banner(
+        "Quality Assurance Writer Agent", "Complete Narrative", review_agent, "blue"
+    )
+    banner("Distribution Agent", "Social Media Posts", distribution_agent, "magenta")
 
-        Social Media Posts
-        -------------------
-        {distribution_agent}
 
-        """,
-        "magenta",
-    )
-)
+asyncio.run(main())
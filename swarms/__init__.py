@@ -8,4 +8,11 @@ os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
 from swarms.agents import *  # noqa: E402, F403
 from swarms.swarms import *  # noqa: E402, F403
 from swarms.structs import *  # noqa: E402, F403
-from swarms.models import *  # noqa: E402, F403
\ No newline at end of file
+from swarms import models  # noqa: E402
+
+
+def __getattr__(name):
+    # Forward to swarms.models lazily instead of star-importing every model
+    if name in models.__all__:
+        return getattr(models, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
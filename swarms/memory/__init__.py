@@ -1,11 +1,24 @@
-from swarms.memory.pinecone import PineconeVector
+from importlib import import_module
+
 from swarms.memory.base import BaseVectorStore
-from swarms.memory.pg import PgVectorVectorStore
-from swarms.memory.ocean import OceanDB
+
+# Each vector store needs its own client library, so a store's module is only
+# imported once that store is used
+_VECTOR_STORES = {
+    "PineconeVectorStore": "swarms.memory.pinecone",
+    "PgVectorVectorStore": "swarms.memory.pg",
+    "OceanDB": "swarms.memory.ocean",
+}
 
 __all__ = [
     "BaseVectorStore",
-    "PineconeVector",
+    "PineconeVectorStore",
     "PgVectorVectorStore",
     "OceanDB",
 ]
+
+
+def __getattr__(name):
+    if name in _VECTOR_STORES:
+        return getattr(import_module(_VECTOR_STORES[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
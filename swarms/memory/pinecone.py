@@ -1,12 +1,18 @@
-from typing import Optional
-from swarms.memory.vector_stores.base import BaseVector
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, ClassVar, Iterable, Iterator, Optional
+import numpy as np
+from swarms.memory.base import BaseVectorStore
 import pinecone
-from attr import define, field
-from swarms.utils.hash import str_to_hash
+from attr import define, field, Factory
+from swarms.utils.hash import vector_to_hash
 
 
 @define
-class PineconeVectorStoreStore(BaseVector):
+class PineconeVectorStore(BaseVectorStore):
     """
     PineconeVectorStore is a vector storage driver that uses Pinecone as the underlying storage engine.
 
@@ -20,23 +26,38 @@ class PineconeVectorStoreStore(BaseVector):
         environment (str): The environment to use. Either "us-west1-gcp" or "us-east1-gcp".
         project_name (str, optional): The name of the project to use. Defaults to None.
         index (pinecone.Index, optional): The Pinecone index to use. Defaults to None.
+        pool_threads (int, optional): Size of the index's request thread pool used for parallel upserts. Defaults to 30.
+        max_batch_bytes (int, optional): Estimated payload size at which an upsert batch is flushed, kept below
+            Pinecone's 2MB request limit. Defaults to 1_800_000.
+        vector_dtype (str, optional): NumPy dtype vectors are cast to before upserting, e.g. "float16" to round
+            values once recall has been checked for the embedding model. Casting does not shrink the JSON payload,
+            only a binary transport such as gRPC. Defaults to None, vectors are sent as given.
+        semantic_cache_size (int, optional): Maximum number of query results kept in the LRU semantic cache.
+            Similar but different queries share results, so the cache is opt-in. Defaults to 0, disabled.
+        semantic_cache_threshold (float, optional): Minimum cosine similarity between query embeddings for a
+            cached result to be reused. Defaults to 0.87.
+        semantic_cache_ttl (float, optional): Seconds before a cached result expires. Defaults to 7 days.
 
     Methods:
         upsert_vector(vector: list[float], vector_id: Optional[str] = None, namespace: Optional[str] = None, meta: Optional[dict] = None, **kwargs) -> str:
             Upserts a vector into the index.
-        load_entry(vector_id: str, namespace: Optional[str] = None) -> Optional[BaseVector.Entry]:
+        upsert_vectors(vectors: Iterable[tuple], namespace: Optional[str] = None, batch_size: int = 100, **kwargs) -> list[str]:
+            Upserts many (id, vector, meta) tuples into the index in parallel batches.
+        load_entry(vector_id: str, namespace: Optional[str] = None) -> Optional[BaseVectorStore.Entry]:
             Loads a single vector from the index.
-        load_entries(namespace: Optional[str] = None) -> list[BaseVector.Entry]:
+        load_entries(namespace: Optional[str] = None) -> list[BaseVectorStore.Entry]:
             Loads all vectors from the index.
-        query(query: str, count: Optional[int] = None, namespace: Optional[str] = None, include_vectors: bool = False, include_metadata=True, **kwargs) -> list[BaseVector.QueryResult]:
+        query(query: str, count: Optional[int] = None, namespace: Optional[str] = None, include_vectors: bool = False, include_metadata=True, **kwargs) -> list[BaseVectorStore.QueryResult]:
             Queries the index for vectors similar to the given query string.
+        query_batch(queries: list[str], count: Optional[int] = None, namespace: Optional[str] = None, include_vectors: bool = False, include_metadata=True, **kwargs) -> list[list[BaseVectorStore.QueryResult]]:
+            Queries the index for each of the given query strings in parallel.
         create_index(name: str, **kwargs) -> None:
             Creates a new index.
 
     Usage:
-    >>> from swarms.memory.vector_stores.pinecone import PineconeVectorStore
+    >>> from swarms.memory import PineconeVectorStore
     >>> from swarms.utils.embeddings import USEEmbedding
-    >>> from swarms.utils.hash import str_to_hash
+    >>> from swarms.utils.hash import vector_to_hash
     >>> from swarms.utils.dataframe import dataframe_to_hash
     >>> import pandas as pd
     >>>
@@ -90,17 +111,48 @@ class PineconeVectorStoreStore(BaseVector):
     index_name: str = field(kw_only=True)
     environment: str = field(kw_only=True)
     project_name: Optional[str] = field(default=None, kw_only=True)
+    pool_threads: int = field(default=30, kw_only=True)
+    max_batch_bytes: int = field(default=1_800_000, kw_only=True)
+    vector_dtype: Optional[str] = field(default=None, kw_only=True)
+    semantic_cache_size: int = field(default=0, kw_only=True)
+    semantic_cache_threshold: float = field(default=0.87, kw_only=True)
+    semantic_cache_ttl: float = field(default=7 * 24 * 60 * 60, kw_only=True)
     index: pinecone.Index = field(init=False)
+    # Indices are shared between stores so connection pools are reused
+    _index_cache: ClassVar[dict[tuple, pinecone.Index]] = {}
+    # (query, params) -> (row, results, created_at), in LRU order
+    _semantic_cache: OrderedDict = field(default=Factory(OrderedDict), init=False)
+    # Normalized query vectors, and the params and key of the entry in each row
+    _semantic_vectors: Optional[np.ndarray] = field(default=None, init=False)
+    _semantic_row_params: Optional[np.ndarray] = field(default=None, init=False)
+    _semantic_row_keys: list = field(default=Factory(list), init=False)
+    _semantic_free_rows: list = field(default=Factory(list), init=False)
+    # Guards the semantic cache, queries may run on futures_executor threads
+    _semantic_lock: threading.Lock = field(default=Factory(threading.Lock), init=False)
+    _embed_cached: Callable[[str], list[float]] = field(init=False)
 
     def __attrs_post_init__(self) -> None:
         """Post init"""
-        pinecone.init(
-            api_key=self.api_key,
-            environment=self.environment,
-            project_name=self.project_name,
+        # Every setting the shared Index is created with is part of the key
+        key = (
+            self.api_key,
+            self.environment,
+            self.project_name,
+            self.index_name,
+            self.pool_threads,
         )
+        self.index = self._index_cache.get(key)
 
-        self.index = pinecone.Index(self.index_name)
+        if self.index is None:
+            pinecone.init(
+                api_key=self.api_key,
+                environment=self.environment,
+                project_name=self.project_name,
+            )
+
+            self.index = pinecone.Index(self.index_name, pool_threads=self.pool_threads)
+            self._index_cache[key] = self.index
+        self._embed_cached = lru_cache(maxsize=2048)(self.embedding_driver.embed_string)
 
     def upsert_vector(
         self,
@@ -111,17 +163,73 @@ class PineconeVectorStoreStore(BaseVector):
         **kwargs
     ) -> str:
         """Upsert vector"""
-        vector_id = vector_id if vector_id else str_to_hash(str(vector))
+        return self.upsert_vectors(
+            [(vector_id, vector, meta)], namespace=namespace, **kwargs
+        )[0]
+
+    def upsert_vectors(
+        self,
+        vectors: Iterable[tuple],
+        namespace: Optional[str] = None,
+        batch_size: int = 100,
+        **kwargs
+    ) -> list[str]:
+        """Upsert (id, vector, meta) tuples in batches, dispatching the batches in parallel"""
+        items = [
+            (
+                vector_id if vector_id else vector_to_hash(vector),
+                np.asarray(vector, dtype=self.vector_dtype).tolist()
+                if self.vector_dtype
+                else vector,
+                meta,
+            )
+            for vector_id, vector, meta in vectors
+        ]
+
+        async_results = [
+            self.index.upsert(
+                vectors=chunk, namespace=namespace, async_req=True, **kwargs
+            )
+            for chunk in self._batches(items, batch_size)
+        ]
+
+        # Block on every batch so that failed requests surface here
+        for result in async_results:
+            result.get()
+
+        # Cached query results may no longer reflect the index
+        with self._semantic_lock:
+            self._semantic_cache_clear()
+
+        return [vector_id for vector_id, _, _ in items]
+
+    def _batches(
+        self, items: Iterable[tuple], batch_size: int
+    ) -> Iterator[list[tuple]]:
+        """Yield batches of at most batch_size items whose estimated payload stays under max_batch_bytes"""
+        batch = []
+        batch_bytes = 0
 
-        params = {"namespace": namespace} | kwargs
+        for item in items:
+            item_bytes = len(json.dumps(item))
 
-        self.index.upsert([(vector_id, vector, meta)], **params)
+            if batch and (
+                len(batch) >= batch_size
+                or batch_bytes + item_bytes > self.max_batch_bytes
+            ):
+                yield batch
+                batch = []
+                batch_bytes = 0
 
-        return vector_id
+            batch.append(item)
+            batch_bytes += item_bytes
+
+        if batch:
+            yield batch
 
     def load_entry(
         self, vector_id: str, namespace: Optional[str] = None
-    ) -> Optional[BaseVector.Entry]:
+    ) -> Optional[BaseVectorStore.Entry]:
         """Load entry"""
         result = self.index.fetch(ids=[vector_id], namespace=namespace).to_dict()
         vectors = list(result["vectors"].values())
@@ -129,7 +237,7 @@ class PineconeVectorStoreStore(BaseVector):
         if len(vectors) > 0:
             vector = vectors[0]
 
-            return BaseVector.Entry(
+            return BaseVectorStore.Entry(
                 id=vector["id"],
                 meta=vector["metadata"],
                 vector=vector["values"],
@@ -138,21 +246,23 @@ class PineconeVectorStoreStore(BaseVector):
         else:
             return None
 
-    def load_entries(self, namespace: Optional[str] = None) -> list[BaseVector.Entry]:
+    def load_entries(self, namespace: Optional[str] = None) -> list[BaseVectorStore.Entry]:
         """Load entries"""
         # This is a hacky way to query up to 10,000 values from Pinecone. Waiting on an official API for fetching
         # all values from a namespace:
         # https://community.pinecone.io/t/is-there-a-way-to-query-all-the-vectors-and-or-metadata-from-a-namespace/797/5
+        # The pinecone.init client this store uses has no index.list to page through ids.
 
         results = self.index.query(
-            self.embedding_driver.embed_string(""),
+            # The empty string's embedding is cached, not recomputed per call
+            self._embed_cached(""),
             top_k=10000,
             include_metadata=True,
             namespace=namespace,
         )
 
         return [
-            BaseVector.Entry(
+            BaseVectorStore.Entry(
                 id=r["id"],
                 vector=r["values"],
                 meta=r["metadata"],
@@ -170,21 +280,66 @@ class PineconeVectorStoreStore(BaseVector):
         # PineconeVectorStoreStorageDriver-specific params:
         include_metadata=True,
         **kwargs
-    ) -> list[BaseVector.QueryResult]:
+    ) -> list[BaseVectorStore.QueryResult]:
         """Query vectors"""
-        vector = self.embedding_driver.embed_string(query)
+        vector = self._embed_cached(query)
+
+        cache_params = repr((count, namespace, include_vectors, include_metadata, kwargs))
+        cached = self._semantic_cache_lookup(vector, cache_params)
+
+        if cached is not None:
+            return cached
+
+        results = self.index.query(
+            vector,
+            top_k=count if count else BaseVectorStore.DEFAULT_QUERY_COUNT,
+            namespace=namespace,
+            include_values=include_vectors,
+            include_metadata=include_metadata,
+            **kwargs
+        )
+
+        query_results = self._to_query_results(results)
+
+        self._semantic_cache_store(query, vector, cache_params, query_results)
+
+        return query_results
+
+    def query_batch(
+        self,
+        queries: list[str],
+        count: Optional[int] = None,
+        namespace: Optional[str] = None,
+        include_vectors: bool = False,
+        include_metadata=True,
+        **kwargs
+    ) -> list[list[BaseVectorStore.QueryResult]]:
+        """Query vectors for many query strings, embedding in one batch and querying in parallel"""
+        if hasattr(self.embedding_driver, "embed_strings"):
+            vectors = self.embedding_driver.embed_strings(queries)
+        else:
+            vectors = list(self.futures_executor.map(self._embed_cached, queries))
 
-        params = {
-            "top_k": count if count else BaseVector.DEFAULT_QUERY_COUNT,
-            "namespace": namespace,
-            "include_values": include_vectors,
-            "include_metadata": include_metadata,
-        } | kwargs
+        async_results = [
+            self.index.query(
+                vector,
+                top_k=count if count else BaseVectorStore.DEFAULT_QUERY_COUNT,
+                namespace=namespace,
+                include_values=include_vectors,
+                include_metadata=include_metadata,
+                async_req=True,
+                **kwargs
+            )
+            for vector in vectors
+        ]
 
-        results = self.index.query(vector, **params)
+        return [self._to_query_results(r.get()) for r in async_results]
 
+    @staticmethod
+    def _to_query_results(results) -> list[BaseVectorStore.QueryResult]:
+        """Convert a Pinecone query response into query results"""
         return [
-            BaseVector.QueryResult(
+            BaseVectorStore.QueryResult(
                 id=r["id"],
                 vector=r["values"],
                 score=r["score"],
@@ -194,6 +349,111 @@ class PineconeVectorStoreStore(BaseVector):
             for r in results["matches"]
         ]
 
+    def _semantic_cache_lookup(
+        self, vector: list[float], cache_params: str
+    ) -> Optional[list[BaseVectorStore.QueryResult]]:
+        """Return cached results for the most similar prior query with the same params, if close enough"""
+        if not self.semantic_cache_size:
+            return None
+
+        v = self._normalized(vector)
+        if v is None:
+            return None
+
+        with self._semantic_lock:
+            if (
+                not self._semantic_cache
+                or v.shape[0] != self._semantic_vectors.shape[1]
+            ):
+                return None
+
+            # Rows are stored normalized, so one matrix-vector product gives every
+            # cosine similarity; free rows and other params never match
+            sims = self._semantic_vectors @ v
+            sims[self._semantic_row_params != cache_params] = -np.inf
+            best = int(np.argmax(sims))
+
+            if sims[best] < self.semantic_cache_threshold:
+                return None
+
+            key = self._semantic_row_keys[best]
+            _, results, created_at = self._semantic_cache[key]
+
+            # Entries expire lazily, when they would be served
+            if time.time() - created_at > self.semantic_cache_ttl:
+                self._semantic_cache_evict(key)
+                return None
+
+            self._semantic_cache.move_to_end(key)
+
+            # A copy, so callers mutating the results leave the cache intact
+            return list(results)
+
+    def _semantic_cache_store(
+        self,
+        query: str,
+        vector: list[float],
+        cache_params: str,
+        results: list[BaseVectorStore.QueryResult],
+    ) -> None:
+        """Insert results into the semantic cache, evicting the least recently used entries"""
+        if not self.semantic_cache_size:
+            return
+
+        v = self._normalized(vector)
+        if v is None:
+            return
+
+        with self._semantic_lock:
+            if (
+                self._semantic_vectors is None
+                or self._semantic_vectors.shape[1] != v.shape[0]
+            ):
+                # Preallocated once per embedding dimension
+                self._semantic_vectors = np.zeros(
+                    (self.semantic_cache_size, v.shape[0]), dtype=np.float32
+                )
+                self._semantic_cache_clear()
+
+            key = (query, cache_params)
+            if key in self._semantic_cache:
+                row = self._semantic_cache[key][0]
+            else:
+                if not self._semantic_free_rows:
+                    self._semantic_cache_evict(next(iter(self._semantic_cache)))
+                row = self._semantic_free_rows.pop()
+
+            self._semantic_vectors[row] = v
+            self._semantic_row_params[row] = cache_params
+            self._semantic_row_keys[row] = key
+            self._semantic_cache[key] = (row, list(results), time.time())
+            self._semantic_cache.move_to_end(key)
+
+    def _semantic_cache_evict(self, key: tuple) -> None:
+        """Drop a cached entry and free its row, called with _semantic_lock held"""
+        row = self._semantic_cache.pop(key)[0]
+        self._semantic_row_params[row] = None
+        self._semantic_row_keys[row] = None
+        self._semantic_free_rows.append(row)
+
+    def _semantic_cache_clear(self) -> None:
+        """Drop every cached entry, keeping the allocated rows, called with _semantic_lock held"""
+        self._semantic_cache.clear()
+        if self._semantic_vectors is None:
+            return
+
+        size = self._semantic_vectors.shape[0]
+        self._semantic_row_params = np.full(size, None, dtype=object)
+        self._semantic_row_keys = [None] * size
+        self._semantic_free_rows = list(range(size - 1, -1, -1))
+
+    @staticmethod
+    def _normalized(vector: list[float]) -> Optional[np.ndarray]:
+        """vector as a unit float32 array, None for a zero vector"""
+        v = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(v)
+        return v / norm if norm else None
+
     def create_index(self, name: str, **kwargs) -> None:
         """Create index"""
         params = {"name": name, "dimension": self.embedding_driver.dimensions} | kwargs
@@ -1,30 +1,30 @@
-import sys
+import importlib
 
-log_file = open("errors.txt", "w")
-sys.stderr = log_file
-
-# LLMs
-from swarms.models.anthropic import Anthropic  # noqa: E402
-from swarms.models.petals import Petals  # noqa: E402
-from swarms.models.mistral import Mistral  # noqa: E402
-from swarms.models.openai_models import OpenAI, AzureOpenAI, OpenAIChat  # noqa: E402
-from swarms.models.zephyr import Zephyr  # noqa: E402
-from swarms.models.biogpt import BioGPT  # noqa: E402
-from swarms.models.huggingface import HuggingfaceLLM  # noqa: E402
-from swarms.models.wizard_storytelling import WizardLLMStoryTeller  # noqa: E402
-from swarms.models.mpt import MPT7B  # noqa: E402
-
-# MultiModal Models
-from swarms.models.idefics import Idefics  # noqa: E402
-
-# from swarms.models.kosmos_two import Kosmos  # noqa: E402
-from swarms.models.vilt import Vilt  # noqa: E402
-from swarms.models.nougat import Nougat  # noqa: E402
-from swarms.models.layoutlm_document_qa import LayoutLMDocumentQA  # noqa: E402
-
-# from swarms.models.gpt4v import GPT4Vision
-# from swarms.models.dalle3 import Dalle3
-# from swarms.models.distilled_whisperx import DistilWhisperModel # noqa: E402
+# Models are imported lazily on first attribute access (PEP 562) so that
+# importing one model does not pay for torch/transformers in all the others.
+_LAZY = {
+    # LLMs
+    "Anthropic": "swarms.models.anthropic",
+    "Petals": "swarms.models.petals",
+    "Mistral": "swarms.models.mistral",
+    "OpenAI": "swarms.models.openai_models",
+    "AzureOpenAI": "swarms.models.openai_models",
+    "OpenAIChat": "swarms.models.openai_models",
+    "Zephyr": "swarms.models.zephyr",
+    "BioGPT": "swarms.models.biogpt",
+    "HuggingfaceLLM": "swarms.models.huggingface",
+    "WizardLLMStoryTeller": "swarms.models.wizard_storytelling",
+    "MPT7B": "swarms.models.mpt",
+    # MultiModal Models
+    "Idefics": "swarms.models.idefics",
+    # "Kosmos": "swarms.models.kosmos_two",
+    "Vilt": "swarms.models.vilt",
+    "Nougat": "swarms.models.nougat",
+    "LayoutLMDocumentQA": "swarms.models.layoutlm_document_qa",
+    # "GPT4Vision": "swarms.models.gpt4v",
+    # "Dalle3": "swarms.models.dalle3",
+    # "DistilWhisperModel": "swarms.models.distilled_whisperx",
+}
 
 __all__ = [
     "Anthropic",
@@ -46,3 +46,16 @@ __all__ = [
     # "GPT4Vision",
     # "Dalle3",
 ]
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    obj = getattr(importlib.import_module(_LAZY[name]), name)
+    globals()[name] = obj
+    return obj
+
+
+def __dir__():
+    return __all__
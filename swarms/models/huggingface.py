@@ -1,13 +1,20 @@
 import asyncio
 import concurrent.futures
 import logging
+import warnings
+from functools import lru_cache
 from typing import List, Tuple
 
 
 import torch
 from termcolor import colored
 from torch.nn.parallel import DistributedDataParallel as DDP
-from transformers import AutoModelForCausalLM, AutoTokenizer, BitsAndBytesConfig
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    BitsAndBytesConfig,
+    TextStreamer,
+)
 
 
 class HuggingfaceLLM:
@@ -21,6 +28,8 @@ class HuggingfaceLLM:
         quantize (bool, optional): Whether to use quantization. Defaults to False.
         quantization_config (dict, optional): The configuration for quantization.
         verbose (bool, optional): Whether to print verbose logs. Defaults to False.
+        compile_model (bool, optional): Whether to torch.compile the forward pass of unquantized CUDA models. Defaults to False,
+            since generate feeds it varying sequence lengths that each trigger a recompile.
         logger (logging.Logger, optional): The logger to use. Defaults to a basic logger.
 
     # Usage
@@ -53,6 +62,7 @@ class HuggingfaceLLM:
         temperature: float = 0.7,
         top_k: int = 40,
         top_p: float = 0.8,
+        compile_model: bool = False,
         *args,
         **kwargs,
     ):
@@ -66,6 +76,7 @@ class HuggingfaceLLM:
         self.distributed = distributed
         self.decoding = decoding
         self.model, self.tokenizer = None, None
+        self.loaded = False
         self.quantize = quantize
         self.quantization_config = quantization_config
         self.max_workers = max_workers
@@ -74,6 +85,10 @@ class HuggingfaceLLM:
         self.temperature = temperature
         self.top_k = top_k
         self.top_p = top_p
+        self.compile_model = compile_model
+
+        # Repeated prompts (system prompts, retries) skip re-tokenization
+        self.encode = lru_cache(maxsize=256)(self._encode)
 
         if self.distributed:
             assert (
@@ -99,7 +114,7 @@ class HuggingfaceLLM:
                 self.model_id, quantization_config=bnb_config, *args, **kwargs
             )
 
-            self.model  # .to(self.device)
+            self.prepare_model()
         except Exception as e:
             # self.logger.error(f"Failed to load the model or the tokenizer: {e}")
             # raise
@@ -115,31 +130,101 @@ class HuggingfaceLLM:
 
     def load_model(self):
         """Load the model"""
-        if not self.model or not self.tokenizer:
-            try:
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
-
-                bnb_config = (
-                    BitsAndBytesConfig(**self.quantization_config)
-                    if self.quantization_config
-                    else None
-                )
+        if self.loaded:
+            return
 
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_id, quantization_config=bnb_config
-                ).to(self.device)
+        try:
+            self.tokenizer = AutoTokenizer.from_pretrained(self.model_id)
 
-                if self.distributed:
-                    self.model = DDP(self.model)
-            except Exception as error:
-                self.logger.error(f"Failed to load the model or the tokenizer: {error}")
-                raise
+            bnb_config = (
+                BitsAndBytesConfig(**self.quantization_config)
+                if self.quantization_config
+                else None
+            )
 
-    def concurrent_run(self, tasks: List[str], max_workers: int = 5):
-        """Concurrently generate text for a list of prompts."""
-        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-            results = list(executor.map(self.run, tasks))
-        return results
+            self.model = AutoModelForCausalLM.from_pretrained(
+                self.model_id, quantization_config=bnb_config
+            )
+
+            self.prepare_model()
+        except Exception as error:
+            self.logger.error(f"Failed to load the model or the tokenizer: {error}")
+            raise
+
+    def prepare_model(self):
+        """Move the freshly loaded model to its device and precision for inference"""
+        # Quantized weights are placed by bitsandbytes and cannot be moved or cast
+        if not self.quantize:
+            self.model.to(self.device)
+
+            if self.use_bf16():
+                self.model.to(dtype=torch.bfloat16)
+
+                if self.compile_model:
+                    self.model.forward = torch.compile(
+                        self.model.forward, mode="reduce-overhead"
+                    )
+
+        self.model.eval()
+        self.model.config.use_cache = True
+
+        if self.distributed:
+            self.model = DDP(self.model)
+
+        self.loaded = True
+
+    def _encode(self, task: str) -> torch.Tensor:
+        """Tokenize a prompt into input ids"""
+        return self.tokenizer.encode(task, return_tensors="pt")
+
+    def use_bf16(self) -> bool:
+        """Whether inference runs in bfloat16 (unquantized models on CUDA)"""
+        return str(self.device).startswith("cuda") and not self.quantize
+
+    def autocast(self):
+        """bfloat16 autocast context for the generate calls"""
+        return torch.autocast(
+            device_type="cuda", dtype=torch.bfloat16, enabled=self.use_bf16()
+        )
+
+    def concurrent_run(self, tasks: List[str], max_workers: int = None) -> List[str]:
+        """
+        Generate text for a list of prompts in a single batched generate call.
+
+        max_workers is deprecated and ignored, the prompts no longer run on threads.
+        """
+        if max_workers is not None:
+            warnings.warn(
+                "concurrent_run no longer uses threads, max_workers is ignored",
+                category=DeprecationWarning,
+                stacklevel=2,
+            )
+
+        self.load_model()
+
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        # Causal LMs must be left padded so generation continues from the prompt,
+        # the tokenizer's own padding side is restored for the other calls
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            inputs = self.tokenizer(
+                tasks, return_tensors="pt", padding=True, truncation=True
+            ).to(self.device)
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+        with torch.inference_mode(), self.autocast():
+            outputs = self.model.generate(
+                **inputs,
+                max_length=self.max_length,
+                do_sample=True,
+                pad_token_id=self.tokenizer.pad_token_id,
+            )
+
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
 
     def run_batch(self, tasks_images: List[Tuple[str, str]]) -> List[str]:
         """Process a batch of tasks and images"""
@@ -168,37 +253,32 @@ class HuggingfaceLLM:
         self.print_dashboard(task)
 
         try:
-            inputs = self.tokenizer.encode(task, return_tensors="pt").to(self.device)
+            inputs = self.encode(task).to(self.device)
 
             # self.log.start()
 
             if self.decoding:
-                with torch.no_grad():
-                    for _ in range(max_length):
-                        output_sequence = []
-
-                        outputs = self.model.generate(
-                            inputs, max_length=len(inputs) + 1, do_sample=True
-                        )
-                        output_tokens = outputs[0][-1]
-                        output_sequence.append(output_tokens.item())
-
-                        # print token in real-time
-                        print(
-                            self.tokenizer.decode(
-                                [output_tokens], skip_special_tokens=True
-                            ),
-                            end="",
-                            flush=True,
-                        )
-                        inputs = outputs
+                # Stream tokens in real-time from a single KV-cached generate call
+                streamer = TextStreamer(self.tokenizer, skip_special_tokens=True)
+                with torch.inference_mode(), self.autocast():
+                    outputs = self.model.generate(
+                        inputs,
+                        max_new_tokens=max_length,
+                        do_sample=True,
+                        temperature=self.temperature,
+                        top_k=self.top_k,
+                        top_p=self.top_p,
+                        repetition_penalty=self.repitition_penalty,
+                        no_repeat_ngram_size=self.no_repeat_ngram_size,
+                        streamer=streamer,
+                        use_cache=True,
+                    )
             else:
-                with torch.no_grad():
+                with torch.inference_mode(), self.autocast():
                     outputs = self.model.generate(
                         inputs, max_length=max_length, do_sample=True
                     )
 
-            del inputs
             return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
         except Exception as e:
             print(
@@ -218,54 +298,11 @@ class HuggingfaceLLM:
 
         Args:
         - task (str): Text to prompt the model.
-        - max_length (int): Maximum length of the response.
 
         Returns:
         - Generated text (str).
         """
-        self.load_model()
-
-        max_length = self.max_length
-
-        self.print_dashboard(task)
-
-        try:
-            inputs = self.tokenizer.encode(task, return_tensors="pt").to(self.device)
-
-            # self.log.start()
-
-            if self.decoding:
-                with torch.no_grad():
-                    for _ in range(max_length):
-                        output_sequence = []
-
-                        outputs = self.model.generate(
-                            inputs, max_length=len(inputs) + 1, do_sample=True
-                        )
-                        output_tokens = outputs[0][-1]
-                        output_sequence.append(output_tokens.item())
-
-                        # print token in real-time
-                        print(
-                            self.tokenizer.decode(
-                                [output_tokens], skip_special_tokens=True
-                            ),
-                            end="",
-                            flush=True,
-                        )
-                        inputs = outputs
-            else:
-                with torch.no_grad():
-                    outputs = self.model.generate(
-                        inputs, max_length=max_length, do_sample=True
-                    )
-
-            del inputs
-
-            return self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        except Exception as e:
-            self.logger.error(f"Failed to generate the text: {e}")
-            raise
+        return self.run(task)
 
     async def __call_async__(self, task: str, *args, **kwargs) -> str:
         """Call the model asynchronously""" ""
@@ -1,4 +1,8 @@
+import hashlib
 import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 
 import cv2
 import numpy as np
@@ -6,21 +10,107 @@ import requests
 import torch
 import torchvision.transforms as T
 from PIL import Image
+from torchvision.utils import draw_bounding_boxes
 from transformers import AutoModelForVision2Seq, AutoProcessor
 
 
+# CLIP normalization, reversed to recover the image from pixel values
+REVERSE_NORM_MEAN = torch.tensor([0.48145466, 0.4578275, 0.40821073]).view(3, 1, 1)
+REVERSE_NORM_STD = torch.tensor([0.26862954, 0.26130258, 0.27577711]).view(3, 1, 1)
+
+
 # utils
+def image_cache_key(image):
+    """Key for an image url or path, PIL image, ndarray or cpu tensor in the encode cache"""
+    if isinstance(image, str):
+        return image
+    # Hash the pixels with their layout so equal arrays of any input type match
+    pixels = np.ascontiguousarray(np.asarray(image))
+    return (
+        pixels.shape,
+        pixels.dtype.str,
+        hashlib.md5(pixels.tobytes()).hexdigest(),
+    )
+
+
+def left_pad_prompts(encoded, pad_token_id):
+    """Batch one-prompt processor outputs, each without its eos and left padded.
+
+    Args:
+        encoded (list): processor outputs for one prompt/image pair each
+        pad_token_id (int): id used to pad input_ids
+
+    Returns:
+        dict: batched pixel_values, input_ids, attention_mask and img_attn_mask
+    """
+    # Drop the eos before padding, so it is the real last token of every row
+    # and not a pad token of the shorter prompts that is removed
+    rows = {
+        name: [inputs[name][0, :-1] for inputs in encoded]
+        for name in ("input_ids", "attention_mask", "img_attn_mask")
+    }
+    width = max(len(row) for row in rows["input_ids"])
+
+    def left_pad(tensors, value):
+        return torch.stack(
+            [
+                torch.nn.functional.pad(tensor, (width - len(tensor), 0), value=value)
+                for tensor in tensors
+            ]
+        )
+
+    return {
+        "pixel_values": torch.cat([inputs["pixel_values"] for inputs in encoded]),
+        "input_ids": left_pad(rows["input_ids"], pad_token_id),
+        "attention_mask": left_pad(rows["attention_mask"], 0),
+        "img_attn_mask": left_pad(rows["img_attn_mask"], 0),
+    }
+
+
 def is_overlapping(rect1, rect2):
     x1, y1, x2, y2 = rect1
     x3, y3, x4, y4 = rect2
     return not (x2 < x3 or x1 > x4 or y2 < y3 or y1 > y4)
 
 
+def resolve_overlap(rect, previous_bboxes, step, image_h):
+    """Shift rect down by step until it overlaps none of previous_bboxes.
+
+    Args:
+        rect (tuple): (x1, y1, x2, y2) box to place
+        previous_bboxes (np.ndarray): (N, 4) array of already placed boxes
+        step (int): vertical shift applied per overlap
+        image_h (int): image height, the box is pinned to the bottom edge once it reaches it
+
+    Returns:
+        tuple: the vertical offset applied and whether the box was pinned to the bottom edge
+    """
+    x1, y1, x2, y2 = rect
+    offset = 0
+
+    while np.any(
+        (x2 >= previous_bboxes[:, 0])
+        & (x1 <= previous_bboxes[:, 2])
+        & (y2 + offset >= previous_bboxes[:, 1])
+        & (y1 + offset <= previous_bboxes[:, 3])
+    ):
+        offset += step
+
+        if y2 + offset >= image_h:
+            return offset, True
+
+    return offset, False
+
+
 class Kosmos:
     """
 
     Args:
-
+        model_name (str): The model to load. Defaults to "ydshieh/kosmos-2-patch14-224".
+        device (str): The device to run on. Defaults to cuda when available.
+        compile_model (bool): Whether to torch.compile the model forward on cuda. Defaults to False,
+            generate feeds it varying sequence lengths that each trigger a recompile.
+        cache_size (int): Number of processed (prompt, image) inputs to keep. Defaults to 64.
 
     # Initialize Kosmos
     kosmos = Kosmos()
@@ -44,126 +134,211 @@ class Kosmos:
     def __init__(
         self,
         model_name="ydshieh/kosmos-2-patch14-224",
+        device: str = None,
+        compile_model: bool = False,
+        cache_size: int = 64,
     ):
-        self.model = AutoModelForVision2Seq.from_pretrained(
-            model_name, trust_remote_code=True
-        )
-        self.processor = AutoProcessor.from_pretrained(
-            model_name, trust_remote_code=True
+        self.model_name = model_name
+        self.device = (
+            device if device else ("cuda" if torch.cuda.is_available() else "cpu")
         )
+        # Half precision runs the vision/text matmuls on tensor cores
+        self.torch_dtype = torch.float16 if self.device == "cuda" else torch.float32
+        self.compile_model = compile_model
+
+        # Downloads and decodes images in the background while the GPU is busy
+        self.pool = ThreadPoolExecutor(max_workers=2)
+        # Processor outputs of recent (prompt, image) pairs, in LRU order
+        self.cache_size = cache_size
+        self.encoded = OrderedDict()
+
+    @cached_property
+    def model(self):
+        """The Kosmos-2 model, loaded onto the device on first use"""
+        model = AutoModelForVision2Seq.from_pretrained(
+            self.model_name, trust_remote_code=True, torch_dtype=self.torch_dtype
+        ).to(self.device)
+        if self.compile_model and self.device == "cuda":
+            model.forward = torch.compile(model.forward, mode="reduce-overhead")
+        return model
+
+    @cached_property
+    def processor(self):
+        """The Kosmos-2 processor, loaded on first use"""
+        return AutoProcessor.from_pretrained(self.model_name, trust_remote_code=True)
+
+    def generate(self, inputs, strip_eos=True):
+        """Generate token ids for processed inputs under half precision autocast
+
+        strip_eos drops the trailing eos column of unpadded inputs; batches from
+        left_pad_prompts have it removed per row already.
+        """
+        # Device copies, so cached cpu inputs are not moved onto the gpu
+        inputs = {name: tensor.to(self.device) for name, tensor in inputs.items()}
+        end = -1 if strip_eos else None
+        with torch.autocast(
+            "cuda", dtype=torch.float16, enabled=self.device == "cuda"
+        ):
+            return self.model.generate(
+                pixel_values=inputs["pixel_values"].to(dtype=self.torch_dtype),
+                input_ids=inputs["input_ids"][:, :end],
+                attention_mask=inputs["attention_mask"][:, :end],
+                img_features=None,
+                img_attn_mask=inputs["img_attn_mask"][:, :end],
+                use_cache=True,
+                max_new_tokens=64,
+            )
+
+    def close(self):
+        """Shut down the image download threads"""
+        self.pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        pool = getattr(self, "pool", None)
+        if pool is not None:
+            pool.shutdown(wait=False)
 
     def get_image(self, url):
         """Image"""
-        return Image.open(requests.get(url, stream=True).raw)
+        image = Image.open(requests.get(url, stream=True).raw)
+        # Decode now rather than lazily on first use by the processor
+        image.load()
+        return image
+
+    def run_urls(self, prompts, urls):
+        """Run Kosmos over prompt/image url pairs, prefetching upcoming images"""
+        images = [self.pool.submit(self.get_image, url) for url in urls]
+        return [
+            self.run(prompt, image.result()) for prompt, image in zip(prompts, images)
+        ]
+
+    def encode(self, prompt, image):
+        """Cpu processor inputs for a prompt and an image, cached by (prompt, image)"""
+        key = (prompt, image_cache_key(image))
+        inputs = self.encoded.get(key)
+
+        if inputs is None:
+            if isinstance(image, str):
+                image = self.get_image(image)
+            inputs = self.processor(text=prompt, images=image, return_tensors="pt")
+            self.encoded[key] = inputs
+            if len(self.encoded) > self.cache_size:
+                self.encoded.popitem(last=False)
+        else:
+            self.encoded.move_to_end(key)
+
+        return inputs
 
     def run(self, prompt, image):
         """Run Kosmos"""
-        inputs = self.processor(text=prompt, images=image, return_tensors="pt")
-        generated_ids = self.model.generate(
-            pixel_values=inputs["pixel_values"],
-            input_ids=inputs["input_ids"][:, :-1],
-            attention_mask=inputs["attention_mask"][:, :-1],
-            img_features=None,
-            img_attn_mask=inputs["img_attn_mask"][:, :-1],
-            use_cache=True,
-            max_new_tokens=64,
-        )
+        generated_ids = self.generate(self.encode(prompt, image))
         generated_texts = self.processor.batch_decode(
             generated_ids,
             skip_special_tokens=True,
         )[0]
-        processed_text, entities = self.processor.post_process_generation(
-            generated_texts
-        )
+        return self.processor.post_process_generation(generated_texts)
 
     def __call__(self, prompt, image):
         """Run call"""
-        inputs = self.processor(text=prompt, images=image, return_tensors="pt")
-        generated_ids = self.model.generate(
-            pixel_values=inputs["pixel_values"],
-            input_ids=inputs["input_ids"][:, :-1],
-            attention_mask=inputs["attention_mask"][:, :-1],
-            img_features=None,
-            img_attn_mask=inputs["img_attn_mask"][:, :-1],
-            use_cache=True,
-            max_new_tokens=64,
+        return self.run(prompt, image)
+
+    def run_batch(self, prompts, images):
+        """Run Kosmos on several prompt/image pairs in one generate call"""
+        # Prompts of different lengths are left padded so generation continues
+        # right after each prompt's last token
+        inputs = left_pad_prompts(
+            [self.encode(prompt, image) for prompt, image in zip(prompts, images)],
+            self.processor.tokenizer.pad_token_id,
         )
+        generated_ids = self.generate(inputs, strip_eos=False)
         generated_texts = self.processor.batch_decode(
             generated_ids,
             skip_special_tokens=True,
-        )[0]
-        processed_text, entities = self.processor.post_process_generation(
-            generated_texts
         )
+        return [
+            self.processor.post_process_generation(text) for text in generated_texts
+        ]
 
     # tasks
     def multimodal_grounding(self, phrase, image_url):
         prompt = f"<grounding><phrase> {phrase} </phrase>"
-        self.run(prompt, image_url)
+        return self.run(prompt, image_url)
 
     def referring_expression_comprehension(self, phrase, image_url):
         prompt = f"<grounding><phrase> {phrase} </phrase>"
-        self.run(prompt, image_url)
+        return self.run(prompt, image_url)
 
     def referring_expression_generation(self, phrase, image_url):
         prompt = (
             "<grounding><phrase>"
             " It</phrase><object><patch_index_0044><patch_index_0863></object> is"
         )
-        self.run(prompt, image_url)
+        return self.run(prompt, image_url)
 
     def grounded_vqa(self, question, image_url):
         prompt = f"<grounding> Question: {question} Answer:"
-        self.run(prompt, image_url)
+        return self.run(prompt, image_url)
 
     def grounded_image_captioning(self, image_url):
         prompt = "<grounding> An image of"
-        self.run(prompt, image_url)
+        return self.run(prompt, image_url)
 
     def grounded_image_captioning_detailed(self, image_url):
         prompt = "<grounding> Describe this image in detail"
-        self.run(prompt, image_url)
+        return self.run(prompt, image_url)
 
-    def draw_entity_boxes_on_image(image, entities, show=False, save_path=None):
+    @staticmethod
+    def draw_entity_boxes_on_image(
+        image, entities, show=False, save_path=None, canvas=None
+    ):
         """_summary_
         Args:
             image (_type_): image or image path
             collect_entity_location (_type_): _description_
+            canvas (np.ndarray, optional): preallocated BGR array of the image's shape to draw on in place
         """
         if isinstance(image, Image.Image):
             image_h = image.height
             image_w = image.width
-            image = np.array(image)[:, :, [2, 1, 0]]
+            image = cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
         elif isinstance(image, str):
             if os.path.exists(image):
                 pil_img = Image.open(image).convert("RGB")
-                image = np.array(pil_img)[:, :, [2, 1, 0]]
+                image = cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
                 image_h = pil_img.height
                 image_w = pil_img.width
             else:
                 raise ValueError(f"invaild image path, {image}")
         elif isinstance(image, torch.Tensor):
             # pdb.set_trace()
-            image_tensor = image.cpu()
-            reverse_norm_mean = torch.tensor([0.48145466, 0.4578275, 0.40821073])[
-                :, None, None
-            ]
-            reverse_norm_std = torch.tensor([0.26862954, 0.26130258, 0.27577711])[
-                :, None, None
-            ]
-            image_tensor = image_tensor * reverse_norm_std + reverse_norm_mean
+            image_tensor = image.cpu() * REVERSE_NORM_STD + REVERSE_NORM_MEAN
             pil_img = T.ToPILImage()(image_tensor)
             image_h = pil_img.height
             image_w = pil_img.width
-            image = np.array(pil_img)[:, :, [2, 1, 0]]
+            image = cv2.cvtColor(np.asarray(pil_img), cv2.COLOR_RGB2BGR)
         else:
             raise ValueError(f"invaild image format, {type(image)} for {image}")
 
-        if len(entities) == 0:
-            return image
+        if canvas is None:
+            # image was freshly converted above, so it can be drawn on directly
+            new_image = image
+        else:
+            np.copyto(canvas, image)
+            new_image = canvas
 
-        new_image = image.copy()
-        previous_bboxes = []
+        if len(entities) == 0:
+            return new_image
+        n_boxes = sum(len(bboxes) for _, _, bboxes in entities)
+        previous_bboxes = np.empty((n_boxes, 4), dtype=np.int64)
+        n_previous = 0
+        # random color per box
+        colors = np.random.randint(0, 255, size=(n_boxes, 3)).tolist()
         # size of text
         text_size = 1
         # thickness of text
@@ -176,103 +351,112 @@ class Kosmos:
         text_offset_original = text_height - base_height
         text_spaces = 3
 
-        for entity_name, (start, end), bboxes in entities:
-            for x1_norm, y1_norm, x2_norm, y2_norm in bboxes:
-                orig_x1, orig_y1, orig_x2, orig_y2 = (
-                    int(x1_norm * image_w),
-                    int(y1_norm * image_h),
-                    int(x2_norm * image_w),
-                    int(y2_norm * image_h),
-                )
-                # draw bbox
-                # random color
-                color = tuple(np.random.randint(0, 255, size=3).tolist())
-                new_image = cv2.rectangle(
-                    new_image, (orig_x1, orig_y1), (orig_x2, orig_y2), color, box_line
-                )
-
-                l_o, r_o = (
-                    box_line // 2 + box_line % 2,
-                    box_line // 2 + box_line % 2 + 1,
-                )
-
-                x1 = orig_x1 - l_o
-                y1 = orig_y1 - l_o
-
-                if y1 < text_height + text_offset_original + 2 * text_spaces:
-                    y1 = (
-                        orig_y1
-                        + r_o
-                        + text_height
-                        + text_offset_original
-                        + 2 * text_spaces
-                    )
-                    x1 = orig_x1 + r_o
-
-                # add text background
-                (text_width, text_height), _ = cv2.getTextSize(
-                    f"  {entity_name}", cv2.FONT_HERSHEY_COMPLEX, text_size, text_line
-                )
-                text_bg_x1, text_bg_y1, text_bg_x2, text_bg_y2 = (
-                    x1,
-                    y1 - (text_height + text_offset_original + 2 * text_spaces),
-                    x1 + text_width,
-                    y1,
-                )
+        # scale every normalized bbox to pixel coordinates in one multiply
+        names = [entity_name for entity_name, _, bboxes in entities for _ in bboxes]
+        all_boxes = np.concatenate(
+            [
+                np.asarray(bboxes, dtype=np.float64).reshape(-1, 4)
+                for _, _, bboxes in entities
+            ]
+        )
+        scaled_boxes = (
+            all_boxes * np.array([image_w, image_h, image_w, image_h], dtype=np.float64)
+        ).astype(np.int64)
+        boxes = list(zip(names, map(tuple, scaled_boxes.tolist()), map(tuple, colors)))
+
+        # draw all bboxes in a single batch
+        np.copyto(
+            new_image,
+            draw_bounding_boxes(
+                torch.from_numpy(new_image).permute(2, 0, 1),
+                torch.from_numpy(scaled_boxes),
+                colors=[color for _, _, color in boxes],
+                width=box_line,
+            )
+            .permute(1, 2, 0)
+            .numpy(),
+        )
 
-                for prev_bbox in previous_bboxes:
-                    while is_overlapping(
-                        (text_bg_x1, text_bg_y1, text_bg_x2, text_bg_y2), prev_bbox
-                    ):
-                        text_bg_y1 += (
-                            text_height + text_offset_original + 2 * text_spaces
-                        )
-                        text_bg_y2 += (
-                            text_height + text_offset_original + 2 * text_spaces
-                        )
-                        y1 += text_height + text_offset_original + 2 * text_spaces
-
-                        if text_bg_y2 >= image_h:
-                            text_bg_y1 = max(
-                                0,
-                                image_h
-                                - (
-                                    text_height + text_offset_original + 2 * text_spaces
-                                ),
-                            )
-                            text_bg_y2 = image_h
-                            y1 = image_h
-                            break
-
-                alpha = 0.5
-                for i in range(text_bg_y1, text_bg_y2):
-                    for j in range(text_bg_x1, text_bg_x2):
-                        if i < image_h and j < image_w:
-                            if j < text_bg_x1 + 1.35 * c_width:
-                                # original color
-                                bg_color = color
-                            else:
-                                # white
-                                bg_color = [255, 255, 255]
-                            new_image[i, j] = (
-                                alpha * new_image[i, j]
-                                + (1 - alpha) * np.array(bg_color)
-                            ).astype(np.uint8)
-
-                cv2.putText(
-                    new_image,
-                    f"  {entity_name}",
-                    (x1, y1 - text_offset_original - 1 * text_spaces),
-                    cv2.FONT_HERSHEY_COMPLEX,
-                    text_size,
-                    (0, 0, 0),
-                    text_line,
-                    cv2.LINE_AA,
+        for entity_name, (orig_x1, orig_y1, orig_x2, orig_y2), color in boxes:
+            l_o, r_o = (
+                box_line // 2 + box_line % 2,
+                box_line // 2 + box_line % 2 + 1,
+            )
+
+            x1 = orig_x1 - l_o
+            y1 = orig_y1 - l_o
+
+            if y1 < text_height + text_offset_original + 2 * text_spaces:
+                y1 = (
+                    orig_y1
+                    + r_o
+                    + text_height
+                    + text_offset_original
+                    + 2 * text_spaces
                 )
-                # previous_locations.append((x1, y1))
-                previous_bboxes.append((text_bg_x1, text_bg_y1, text_bg_x2, text_bg_y2))
-
-        pil_image = Image.fromarray(new_image[:, :, [2, 1, 0]])
+                x1 = orig_x1 + r_o
+
+            # add text background
+            (text_width, text_height), _ = cv2.getTextSize(
+                f"  {entity_name}", cv2.FONT_HERSHEY_COMPLEX, text_size, text_line
+            )
+            text_bg_x1, text_bg_y1, text_bg_x2, text_bg_y2 = (
+                x1,
+                y1 - (text_height + text_offset_original + 2 * text_spaces),
+                x1 + text_width,
+                y1,
+            )
+
+            step = text_height + text_offset_original + 2 * text_spaces
+            offset, pinned = resolve_overlap(
+                (text_bg_x1, text_bg_y1, text_bg_x2, text_bg_y2),
+                previous_bboxes[:n_previous],
+                step,
+                image_h,
+            )
+            if pinned:
+                text_bg_y1 = max(0, image_h - step)
+                text_bg_y2 = image_h
+                y1 = image_h
+            else:
+                text_bg_y1 += offset
+                text_bg_y2 += offset
+                y1 += offset
+
+            alpha = 0.5
+            bg_x1, bg_y1 = max(text_bg_x1, 0), max(text_bg_y1, 0)
+            bg_x2, bg_y2 = min(text_bg_x2, image_w), min(text_bg_y2, image_h)
+            if bg_x2 > bg_x1 and bg_y2 > bg_y1:
+                # original color on the left, white on the right
+                split = max(int(np.ceil(text_bg_x1 + 1.35 * c_width)) - bg_x1, 0)
+                bg = np.empty((bg_y2 - bg_y1, bg_x2 - bg_x1, 3), dtype=np.float32)
+                bg[:, :split] = color
+                bg[:, split:] = 255
+                roi = new_image[bg_y1:bg_y2, bg_x1:bg_x2].astype(np.float32)
+                new_image[bg_y1:bg_y2, bg_x1:bg_x2] = (
+                    alpha * roi + (1 - alpha) * bg
+                ).astype(np.uint8)
+
+            cv2.putText(
+                new_image,
+                f"  {entity_name}",
+                (x1, y1 - text_offset_original - 1 * text_spaces),
+                cv2.FONT_HERSHEY_COMPLEX,
+                text_size,
+                (0, 0, 0),
+                text_line,
+                cv2.LINE_AA,
+            )
+            # previous_locations.append((x1, y1))
+            previous_bboxes[n_previous] = (
+                text_bg_x1,
+                text_bg_y1,
+                text_bg_x2,
+                text_bg_y2,
+            )
+            n_previous += 1
+
+        pil_image = Image.fromarray(cv2.cvtColor(new_image, cv2.COLOR_BGR2RGB))
         if save_path:
             pil_image.save(save_path)
         if show:
@@ -282,5 +466,5 @@ class Kosmos:
 
     def generate_boxees(self, prompt, image_url):
         image = self.get_image(image_url)
-        processed_text, entities = self.process_prompt(prompt, image)
+        processed_text, entities = self.run(prompt, image)
         self.draw_entity_boxes_on_image(image, entities, show=True)
@@ -1,5 +1,9 @@
+import threading
+from functools import cached_property
+from typing import List
+
 import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import AutoModelForCausalLM, AutoTokenizer, TextIteratorStreamer
 
 from swarms.agents.message import Message
 
@@ -17,6 +21,7 @@ class Mistral:
         temperature (float, optional): Temperature. Defaults to 1.0.
         max_length (int, optional): Max length. Defaults to 100.
         do_sample (bool, optional): Whether to sample. Defaults to True.
+        max_chat_length (int, optional): Max tokens of conversation kept for chat, older turns are dropped. Defaults to 4096.
 
     Usage:
     from swarms.models import Mistral
@@ -38,6 +43,7 @@ class Mistral:
         temperature: float = 1.0,
         max_length: int = 100,
         do_sample: bool = True,
+        max_chat_length: int = 4096,
     ):
         self.ai_name = ai_name
         self.system_prompt = system_prompt
@@ -46,34 +52,67 @@ class Mistral:
         self.use_flash_attention = use_flash_attention
         self.temperature = temperature
         self.max_length = max_length
+        self.do_sample = do_sample
+        self.max_chat_length = max_chat_length
 
         # Check if the specified device is available
         if not torch.cuda.is_available() and device == "cuda":
             raise ValueError("CUDA is not available. Please choose a different device.")
 
-        # Load the model and tokenizer
-        self.model = None
-        self.tokenizer = None
-        self.load_model()
-
         self.history = []
 
-    def load_model(self):
+        # Token ids and KV-cache of the conversation so far, reused across chat turns
+        self.chat_ids = None
+        self.past_key_values = None
+
+    @cached_property
+    def model(self):
+        """The causal LM, loaded onto the device on first use"""
         try:
-            self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
-            self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-            self.model.to(self.device)
+            if self.device == "cuda":
+                torch.backends.cuda.enable_flash_sdp(True)
+
+            model = AutoModelForCausalLM.from_pretrained(
+                self.model_name,
+                torch_dtype=torch.bfloat16 if self.device == "cuda" else torch.float32,
+                attn_implementation=(
+                    "flash_attention_2" if self.use_flash_attention else "sdpa"
+                ),
+            )
+            model.to(self.device)
+            model.config.use_cache = True
+            return model
         except Exception as e:
             raise ValueError(f"Error loading the Mistral model: {str(e)}")
 
+    @cached_property
+    def tokenizer(self):
+        """The tokenizer, loaded on first use"""
+        try:
+            return AutoTokenizer.from_pretrained(self.model_name)
+        except Exception as e:
+            raise ValueError(f"Error loading the Mistral tokenizer: {str(e)}")
+
+    def load_model(self):
+        """Load the model and tokenizer up front instead of on first use"""
+        return self.model, self.tokenizer
+
+    def _to_device(self, encoding) -> dict:
+        """Move tokenized inputs to the device, through pinned memory on cuda"""
+        if self.device == "cuda":
+            return {
+                key: value.pin_memory().to(self.device, non_blocking=True)
+                for key, value in encoding.items()
+            }
+        return {key: value.to(self.device) for key, value in encoding.items()}
+
     def run(self, task: str):
         """Run the model on a given task."""
 
         try:
-            model_inputs = self.tokenizer([task], return_tensors="pt").to(self.device)
+            model_inputs = self._to_device(self.tokenizer([task], return_tensors="pt"))
             generated_ids = self.model.generate(
                 **model_inputs,
-                max_length=self.max_length,
                 do_sample=self.do_sample,
                 temperature=self.temperature,
                 max_new_tokens=self.max_length,
@@ -83,23 +122,46 @@ class Mistral:
         except Exception as e:
             raise ValueError(f"Error running the model: {str(e)}")
 
-    def __call__(self, task: str):
-        """Run the model on a given task."""
+    def run_batch(self, tasks: List[str]) -> List[str]:
+        """Run the model on several tasks in one padded generate call."""
 
         try:
-            model_inputs = self.tokenizer([task], return_tensors="pt").to(self.device)
+            if self.tokenizer.pad_token is None:
+                self.tokenizer.pad_token = self.tokenizer.eos_token
+
+            # Left padding keeps every prompt adjacent to its generated tokens,
+            # the tokenizer's own padding side is restored for the other calls
+            padding_side = self.tokenizer.padding_side
+            self.tokenizer.padding_side = "left"
+            try:
+                encoding = self.tokenizer(tasks, return_tensors="pt", padding=True)
+            finally:
+                self.tokenizer.padding_side = padding_side
+
+            model_inputs = self._to_device(encoding)
             generated_ids = self.model.generate(
                 **model_inputs,
-                max_length=self.max_length,
                 do_sample=self.do_sample,
                 temperature=self.temperature,
                 max_new_tokens=self.max_length,
+                pad_token_id=self.tokenizer.pad_token_id,
             )
-            output_text = self.tokenizer.batch_decode(generated_ids)[0]
-            return output_text
+            return self.tokenizer.batch_decode(generated_ids)
         except Exception as e:
             raise ValueError(f"Error running the model: {str(e)}")
 
+    def __call__(self, task: str):
+        """Run the model on a given task."""
+        return self.run(task)
+
+    def reset_chat(self):
+        """Start a new conversation, dropping the history and its KV-cache"""
+        self.history = []
+        self.chat_ids = None
+        self.past_key_values = None
+
+    clear_history = reset_chat
+
     def chat(self, msg: str = None, streaming: bool = False):
         """
         Run chat
@@ -124,16 +186,31 @@ class Mistral:
 
         # process msg
         try:
-            response = self.agent.run(msg)
+            # Only the new message is tokenized; the cached keys/values cover the
+            # earlier turns so generate does not recompute attention over them
+            input_ids = self.tokenizer(
+                msg, return_tensors="pt", add_special_tokens=self.chat_ids is None
+            ).input_ids.to(self.device)
+            if self.chat_ids is not None:
+                input_ids = torch.cat([self.chat_ids, input_ids], dim=-1)
 
-            # add agent's response to the history
-            self.history.append(Message("Agent", response))
+            # Past the limit the cache is dropped and the most recent tokens are
+            # prefilled again, leaving room for the reply
+            window = self.max_chat_length - self.max_length
+            if input_ids.shape[-1] > window:
+                input_ids = input_ids[:, -window:]
+                self.past_key_values = None
 
             # if streaming is = True
             if streaming:
-                return self._stream_response(response)
-            else:
-                response
+                return self._stream_response(input_ids)
+
+            response = self._generate_reply(input_ids)
+
+            # add agent's response to the history
+            self.history.append(Message("Agent", response))
+
+            return response
 
         except Exception as error:
             error_message = f"Error processing message: {str(error)}"
@@ -143,15 +220,54 @@ class Mistral:
 
             return error_message
 
-    def _stream_response(self, response: str = None):
+    def _generate_reply(self, input_ids: torch.Tensor, streamer=None) -> str:
+        """Generate a chat reply, keeping the conversation's KV-cache for the next turn"""
+        outputs = self.model.generate(
+            input_ids=input_ids,
+            past_key_values=self.past_key_values,
+            use_cache=True,
+            return_dict_in_generate=True,
+            do_sample=self.do_sample,
+            temperature=self.temperature,
+            max_new_tokens=self.max_length,
+            streamer=streamer,
+        )
+        self.chat_ids = outputs.sequences
+        self.past_key_values = outputs.past_key_values
+
+        return self.tokenizer.decode(
+            outputs.sequences[0, input_ids.shape[-1] :], skip_special_tokens=True
+        )
+
+    def _stream_response(self, input_ids: torch.Tensor):
         """
-        Yield the response token by token (word by word)
+        Yield the response text as it is generated
 
         Usage:
         --------------
-        for token in _stream_response(response):
+        for token in _stream_response(input_ids):
             print(token)
 
         """
-        for token in response.split():
-            yield token
+        streamer = TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        reply = {}
+
+        def generate():
+            try:
+                reply["response"] = self._generate_reply(input_ids, streamer)
+            except Exception as error:
+                reply["error"] = error
+                # unblock the consumer, generate will not end the stream itself
+                streamer.end()
+
+        thread = threading.Thread(target=generate)
+        thread.start()
+
+        yield from streamer
+
+        thread.join()
+        if "error" in reply:
+            raise reply["error"]
+        self.history.append(Message("Agent", reply["response"]))
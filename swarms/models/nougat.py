@@ -8,11 +8,30 @@ format
 - Extracting metadata from pdfs
 
 """
+import logging
 import re
+from functools import cached_property
+from typing import List, Union
+
 import torch
 from PIL import Image
 from transformers import NougatProcessor, VisionEncoderDecoderModel
 
+logger = logging.getLogger(__name__)
+
+# Pattern to extract the daily balances from the transcription
+DAILY_BALANCE_PATTERN = re.compile(
+    r"\*\*(\d{2}/\d{2}/\d{4})\*\*\n\n\*\*([\d,]+\.\d{2})\*\*"
+)
+
+
+@torch.jit.script
+def normalize_pixel_values(
+    pixel_values: torch.Tensor, mean: torch.Tensor, std: torch.Tensor
+) -> torch.Tensor:
+    """Rescale [0, 255] pixel values to [0, 1] and normalize them per channel"""
+    return (pixel_values / 255.0 - mean.view(-1, 1, 1)) / std.view(-1, 1, 1)
+
 
 class Nougat:
     """
@@ -22,6 +41,8 @@ class Nougat:
         model_name_or_path: str, default="facebook/nougat-base"
         min_length: int, default=1
         max_new_tokens: int, default=30
+        use_cuda_graph: bool, default=False, replay the vision encoder from a captured CUDA graph on GPU.
+            One graph is captured per input shape, so it only pays off when the batch size repeats
 
     Usage:
     >>> from swarms.models.nougat import Nougat
@@ -36,53 +57,132 @@ class Nougat:
         model_name_or_path="facebook/nougat-base",
         min_length: int = 1,
         max_new_tokens: int = 30,
+        use_cuda_graph: bool = False,
     ):
         self.model_name_or_path = model_name_or_path
         self.min_length = min_length
         self.max_new_tokens = max_new_tokens
+        self.use_cuda_graph = use_cuda_graph
 
-        self.processor = NougatProcessor.from_pretrained(self.model_name_or_path)
-        self.model = VisionEncoderDecoderModel.from_pretrained(self.model_name_or_path)
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model.to(self.device)
+        # Half precision runs the encoder/decoder matmuls on tensor cores
+        self.torch_dtype = torch.float16 if self.device == "cuda" else torch.float32
+
+        # Captured encoder graphs with their static input/output buffers, keyed
+        # by input shape
+        self._encoder_graphs = {}
+
+    @cached_property
+    def processor(self):
+        """The Nougat processor, loaded on first use"""
+        return NougatProcessor.from_pretrained(self.model_name_or_path)
+
+    @cached_property
+    def model(self):
+        """The vision encoder-decoder, loaded onto the device on first use"""
+        return VisionEncoderDecoderModel.from_pretrained(
+            self.model_name_or_path, torch_dtype=self.torch_dtype
+        ).to(self.device)
+
+    @cached_property
+    def image_mean(self) -> torch.Tensor:
+        return torch.tensor(
+            self.processor.image_processor.image_mean, device=self.device
+        )
+
+    @cached_property
+    def image_std(self) -> torch.Tensor:
+        return torch.tensor(
+            self.processor.image_processor.image_std, device=self.device
+        )
 
     def get_image(self, img_path: str):
         """Get an image from a path"""
         image = Image.open(img_path)
         return image
 
-    def __call__(self, img_path: str):
-        """Call the model with an image_path str as an input"""
-        image = Image.open(img_path)
-        pixel_values = self.processor(image, return_tensors="pt").pixel_values
-
-        # Generate transcriptions, here we only generate 30 tokens
-        outputs = self.model.generate(
-            pixel_values.to(self.device),
-            min_length=self.min_length,
-            max_new_tokens=self.max_new_tokens,
+    def __call__(self, img_path: Union[str, List[str]]):
+        """Call the model with an image_path str, or a list of them, as an input"""
+        img_paths = [img_path] if isinstance(img_path, str) else img_path
+        images = [Image.open(path) for path in img_paths]
+        # The processor only resizes and pads; rescaling and normalization run
+        # as a scripted function on the model's device
+        pixel_values = self.processor(
+            images, return_tensors="pt", do_rescale=False, do_normalize=False
+        ).pixel_values
+        pixel_values = normalize_pixel_values(
+            pixel_values.to(self.device), self.image_mean, self.image_std
         )
 
-        sequence = self.processor.batch_decode(outputs, skip_special_tokens=True)[0]
-        sequence = self.processor.post_process_generation(sequence, fix_markdown=False)
-
-        out = print(sequence)
-        return out
+        # Generate transcriptions for every image in a single batch
+        with torch.autocast(
+            "cuda", dtype=torch.float16, enabled=self.device == "cuda"
+        ):
+            outputs = self.model.generate(
+                encoder_outputs=self.encode(pixel_values.to(dtype=self.torch_dtype)),
+                min_length=self.min_length,
+                max_new_tokens=self.max_new_tokens,
+            )
+
+        sequences = [
+            self.processor.post_process_generation(sequence, fix_markdown=False)
+            for sequence in self.processor.batch_decode(
+                outputs, skip_special_tokens=True
+            )
+        ]
 
+        for sequence in sequences:
+            print(sequence)
+
+        return sequences[0] if isinstance(img_path, str) else sequences
+
+    def encode(self, pixel_values: torch.Tensor):
+        """Run the vision encoder, replaying a captured CUDA graph for same-shape inputs"""
+        if not (self.use_cuda_graph and self.device == "cuda"):
+            with torch.no_grad():
+                return self.model.encoder(pixel_values=pixel_values)
+
+        shape = tuple(pixel_values.shape)
+        if shape not in self._encoder_graphs:
+            try:
+                self._encoder_graphs[shape] = self._capture_encoder(pixel_values)
+            except Exception as error:
+                logger.warning(
+                    f"CUDA graph capture of the encoder failed, running it eagerly: {error}"
+                )
+                with torch.no_grad():
+                    return self.model.encoder(pixel_values=pixel_values)
+
+        graph, static_pixel_values, static_encoder_outputs = self._encoder_graphs[
+            shape
+        ]
+        static_pixel_values.copy_(pixel_values)
+        graph.replay()
+        return static_encoder_outputs
+
+    def _capture_encoder(self, pixel_values: torch.Tensor):
+        """Capture the encoder forward on a static input buffer, returning the graph and its buffers"""
+        static_pixel_values = pixel_values.clone()
+
+        # Warm up on a side stream so lazy initialization is not captured
+        stream = torch.cuda.Stream()
+        stream.wait_stream(torch.cuda.current_stream())
+        with torch.cuda.stream(stream), torch.no_grad():
+            for _ in range(3):
+                self.model.encoder(pixel_values=static_pixel_values)
+        torch.cuda.current_stream().wait_stream(stream)
+
+        graph = torch.cuda.CUDAGraph()
+        with torch.cuda.graph(graph), torch.no_grad():
+            static_encoder_outputs = self.model.encoder(
+                pixel_values=static_pixel_values
+            )
+        return graph, static_pixel_values, static_encoder_outputs
+
+    @staticmethod
     def clean_nougat_output(raw_output):
-        # Define the pattern to extract the relevant data
-        daily_balance_pattern = (
-            r"\*\*(\d{2}/\d{2}/\d{4})\*\*\n\n\*\*([\d,]+\.\d{2})\*\*"
-        )
-
-        # Find all matches of the pattern
-        matches = re.findall(daily_balance_pattern, raw_output)
-
-        # Convert the matches to a readable format
-        cleaned_data = [
+        # Convert the matches to a readable format, joined with new lines for readability
+        return "\n".join(
             "Date: {}, Amount: {}".format(date, amount.replace(",", ""))
-            for date, amount in matches
-        ]
-
-        # Join the cleaned data with new lines for readability
-        return "\n".join(cleaned_data)
+            for date, amount in DAILY_BALANCE_PATTERN.findall(raw_output)
+        )
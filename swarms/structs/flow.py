@@ -1,14 +1,39 @@
 import asyncio
+import concurrent.futures
 import inspect
+import itertools
 import json
 import logging
 import random
 import re
+import sys
+import threading
 import time
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import Counter, deque
+from functools import lru_cache
+from pathlib import Path
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from termcolor import colored
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
 # Prompts
 DYNAMIC_STOP_PROMPT = """
 When you have finished the task from the Human, output a special token: <DONE>
@@ -50,12 +75,13 @@ commands: {
 """
 
 
+@lru_cache(maxsize=32)
 def autonomous_agent_prompt(
     tools_prompt: str = DYNAMICAL_TOOL_USAGE,
     dynamic_stop_prompt: str = DYNAMIC_STOP_PROMPT,
     agent_name: str = None,
 ):
-    """Autonomous agent prompt"""
+    """Autonomous agent prompt, expanded once per distinct set of arguments"""
     return f"""
     You are a {agent_name}, an autonomous agent granted autonomy in a autonomous loop structure.
     Your purpose is to satisfy the user demands above expectations. For example, if the user asks you to generate a 10,000 word blog,
@@ -84,10 +110,149 @@ def autonomous_agent_prompt(
     """
 
 
+def write_json(file_path: str, obj: Any, indent: bool = False) -> None:
+    """Write obj as JSON to file_path with orjson when installed, deques as lists"""
+    if orjson is not None:
+        # Encoded straight to bytes, without an intermediate str
+        with open(file_path, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    obj, default=list, option=orjson.OPT_INDENT_2 if indent else 0
+                )
+            )
+        return
+
+    # Stream the encoded chunks instead of holding a full copy of obj as a str
+    encoder = json.JSONEncoder(default=list, indent=4 if indent else None)
+    with open(file_path, "w") as f:
+        for chunk in encoder.iterencode(obj):
+            f.write(chunk)
+
+
+def load_json(data: bytes) -> Any:
+    """Parse JSON bytes with orjson when installed"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def run_sync(coroutine):
+    """Run a coroutine to completion from sync code, even inside a running event loop"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+
+    # Called from inside a running event loop, so run ours on a worker thread
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+@lru_cache(maxsize=32)
+def history_prompt_prefix(system_prompt: str) -> str:
+    """The static system prompt part of the agent history prompt, built once per prompt"""
+    return f"""
+            SYSTEM_PROMPT: {system_prompt}
+
+            History: """
+
+
+def backoff_delay(
+    retry_interval: float,
+    attempt: int,
+    cap: float = 30,
+    jitter: Literal["additive", "full"] = "additive",
+) -> float:
+    """
+    Exponential backoff before retry number attempt (1-based), capped at cap
+
+    "additive" jitter adds up to half a second to the exponential delay,
+    "full" jitter draws the whole delay uniformly from zero up to it.
+    """
+    delay = retry_interval * 2 ** (attempt - 1)
+    if jitter == "full":
+        return random.uniform(0, min(cap, delay))
+    return min(cap, delay + random.uniform(0, 0.5))
+
+
+def is_retryable(error: Exception) -> bool:
+    """Client errors other than timeouts and rate limits fail the same way on retry"""
+    status = getattr(error, "http_status", None) or getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return not (
+        isinstance(status, int) and 400 <= status < 500 and status not in (408, 429)
+    )
+
+
+@lru_cache(maxsize=32)
+def reply_prompt_prefix(system_prompt: str) -> str:
+    """The static system prompt part of the generate_reply prompt"""
+    return f"""
+
+        SYSTEM_PROMPT: {system_prompt}
+
+        History: """
+
+
+REPLY_PROMPT_SUFFIX = """
+
+        Your response:
+        """
+
+
+# Values get_llm_params can serialize as is
+JSON_SAFE_TYPES = (str, int, float, bool, list, dict, tuple, type(None))
+
+# llm attributes get_llm_params never serializes: credentials and api clients
+PRIVATE_LLM_PARAM_PATTERN = re.compile(
+    r"(^|_)(key|secret|password|token|credentials)$|client", re.IGNORECASE
+)
+
+# Flow.print_dashboard output, with slots for the flow's attributes
+DASHBOARD_HEADER = "Initializing Agent Dashboard..."
+DASHBOARD_TEMPLATE = """
+                Flow Dashboard
+                --------------------------------------------
+
+                Flow loop is initializing for {max_loops} with the following configuration:
+
+                Model Configuration: {model_config}
+                ----------------------------------------
+
+                Flow Configuration:
+                    Name: {agent_name}
+                    System Prompt: {system_prompt}
+                    Task: {task}
+                    Max Loops: {max_loops}
+                    Stopping Condition: {stopping_condition}
+                    Loop Interval: {loop_interval}
+                    Retry Attempts: {retry_attempts}
+                    Retry Interval: {retry_interval}
+                    Interactive: {interactive}
+                    Dashboard: {dashboard}
+                    Dynamic Temperature: {dynamic_temperature}
+                    Autosave: {autosave}
+                    Saved State: {saved_state_path}
+
+                ----------------------------------------
+                """
+
+# Colored templates for print_history_and_memory, built once
+HISTORY_COLORS = {
+    "title": colored("{}", "cyan", attrs=["bold"]),
+    "loop": colored("{}", "yellow", attrs=["bold"]),
+    "human": colored("{}", "green"),
+    "agent": colored("{}", "blue"),
+    "rule": colored("{}", "cyan"),
+}
+
+# The whole word only, so "nonstop" or "stopwatch" do not stop the flow
+STOP_WORD_PATTERN = re.compile(r"\bstop\b", re.IGNORECASE)
+
+
 # Custom stopping condition
 def stop_when_repeats(response: str) -> bool:
     # Stop if the word stop appears in the response
-    return "Stop" in response.lower()
+    return STOP_WORD_PATTERN.search(response) is not None
 
 
 def parse_done_token(response: str) -> bool:
@@ -95,6 +260,35 @@ def parse_done_token(response: str) -> bool:
     return "<DONE>" in response
 
 
+@lru_cache(maxsize=None)
+def stop_token_pattern(stopping_token: Optional[str] = None) -> re.Pattern:
+    """Regex matching the done token or the custom stopping token in a single scan"""
+    tokens = dict.fromkeys(
+        token for token in ("<DONE>", stopping_token) if token is not None
+    )
+    return re.compile("|".join(map(re.escape, tokens)), re.IGNORECASE)
+
+
+@lru_cache(maxsize=32)
+def response_filter_pattern(filters: Tuple[str, ...]) -> Optional[re.Pattern]:
+    """Regex matching any of the filter words, compiled once per set of filters"""
+    words = sorted((word for word in filters if word), key=len, reverse=True)
+    if not words:
+        return None
+    # Longest words first so they win over filters that are their prefixes
+    return re.compile("|".join(map(re.escape, words)))
+
+
+@lru_cache(maxsize=None)
+def llm_init_param_names(llm_cls) -> Tuple[str, ...]:
+    """Names of an llm class's __init__ parameters, reflected once per class"""
+    return tuple(
+        name
+        for name in inspect.signature(llm_cls.__init__).parameters
+        if name != "self"
+    )
+
+
 class Flow:
     """
     Flow is a chain like structure from langchain that provides the autonomy to language models
@@ -114,6 +308,7 @@ class Flow:
         loop_interval (int): The interval between loops
         retry_attempts (int): The number of retry attempts
         retry_interval (int): The interval between retry attempts
+        max_retry_delay (float): The longest pause between retry attempts
         interactive (bool): Whether or not to run in interactive mode
         dashboard (bool): Whether or not to print the dashboard
         dynamic_temperature(bool): Dynamical temperature handling
@@ -157,6 +352,7 @@ class Flow:
         autosave: bool = False,
         context_length: int = 8192,
         user_name: str = "Human",
+        max_retry_delay: float = 30.0,
         **kwargs: Any,
     ):
         self.llm = llm
@@ -165,6 +361,7 @@ class Flow:
         self.loop_interval = loop_interval
         self.retry_attempts = retry_attempts
         self.retry_interval = retry_interval
+        self.max_retry_delay = max_retry_delay
         self.feedback = []
         self.memory = []
         self.task = None
@@ -175,6 +372,7 @@ class Flow:
         self.dynamic_temperature = dynamic_temperature
         self.dynamic_loops = dynamic_loops
         self.user_name = user_name
+        self.context_length = context_length
         # The max_loops will be set dynamically if the dynamic_loop
         if self.dynamic_loops:
             self.max_loops = "auto"
@@ -188,7 +386,7 @@ class Flow:
     def provide_feedback(self, feedback: str) -> None:
         """Allow users to provide feedback on the responses."""
         self.feedback.append(feedback)
-        logging.info(f"Feedback received: {feedback}")
+        logger.info(f"Feedback received: {feedback}")
 
     def _check_stopping_condition(self, response: str) -> bool:
         """Check if the stopping condition is met."""
@@ -196,7 +394,11 @@ class Flow:
             return self.stopping_condition(response)
         return False
 
-    def dynamic_temperature(self):
+    def _check_stop_token(self, response: str) -> bool:
+        """Check if the done token or the stopping token is in the response."""
+        return stop_token_pattern(self.stopping_token).search(response) is not None
+
+    def _apply_dynamic_temperature(self):
         """
         1. Check the self.llm object for the temperature
         2. If the temperature is not present, then use the default temperature
@@ -205,7 +407,7 @@ class Flow:
         """
         if hasattr(self.llm, "temperature"):
             # Randomly change the temperature attribute of self.llm object
-            self.llm.temperature = random.uniform(0.0, 1.0)
+            self.llm.temperature = random.random()
         else:
             # Use a default temperature
             self.llm.temperature = 0.7
@@ -216,13 +418,11 @@ class Flow:
 
     def get_llm_init_params(self) -> str:
         """Get LLM init params"""
-        init_signature = inspect.signature(self.llm.__init__)
-        params = init_signature.parameters
         params_str_list = []
 
-        for name, param in params.items():
-            if name == "self":
-                continue
+        # Only the signature is cached, values are read fresh since
+        # dynamic_temperature mutates the llm between loops
+        for name in llm_init_param_names(type(self.llm)):
             if hasattr(self.llm, name):
                 value = getattr(self.llm, name)
             else:
@@ -305,12 +505,17 @@ class Flow:
         """
         Take the history and truncate it to fit into the model context length
         """
-        truncated_history = self.memory[-1][-self.context_length :]
-        self.memory[-1] = truncated_history
+        # Entries added by add_task_to_memory are already bounded windows; this
+        # bounds the ones restored from disk or appended by run
+        if not isinstance(self.memory[-1], deque):
+            self.memory[-1] = deque(self.memory[-1], maxlen=self.context_length)
 
     def add_task_to_memory(self, task: str):
         """Add the task to the memory"""
-        self.memory.append([f"{self.user_name}: {task}"])
+        # A bounded deque evicts the oldest messages past the context length
+        self.memory.append(
+            deque([f"{self.user_name}: {task}"], maxlen=self.context_length)
+        )
 
     def add_message_to_memory(self, message: str):
         """Add the message to the memory"""
@@ -318,45 +523,21 @@ class Flow:
 
     def add_message_to_memory_and_truncate(self, message: str):
         """Add the message to the memory and truncate"""
-        self.memory[-1].append(message)
         self.truncate_history()
+        self.memory[-1].append(message)
 
     def print_dashboard(self, task: str):
         """Print dashboard"""
         model_config = self.get_llm_init_params()
-        print(colored("Initializing Agent Dashboard...", "yellow"))
-
-        print(
-            colored(
-                f"""
-                Flow Dashboard
-                --------------------------------------------
-
-                Flow loop is initializing for {self.max_loops} with the following configuration:
-
-                Model Configuration: {model_config}
-                ----------------------------------------
-
-                Flow Configuration:
-                    Name: {self.agent_name}
-                    System Prompt: {self.system_prompt}
-                    Task: {task}
-                    Max Loops: {self.max_loops}
-                    Stopping Condition: {self.stopping_condition}
-                    Loop Interval: {self.loop_interval}
-                    Retry Attempts: {self.retry_attempts}
-                    Retry Interval: {self.retry_interval}
-                    Interactive: {self.interactive}
-                    Dashboard: {self.dashboard}
-                    Dynamic Temperature: {self.dynamic_temperature}
-                    Autosave: {self.autosave}
-                    Saved State: {self.saved_state_path}
-
-                ----------------------------------------
-                """,
-                "green",
-            )
+        header = DASHBOARD_HEADER
+        dashboard = DASHBOARD_TEMPLATE.format_map(
+            {**vars(self), "task": task, "model_config": model_config}
         )
+        # Color codes only for a terminal, piped or logged output stays plain
+        if sys.stdout.isatty():
+            header = colored(header, "yellow")
+            dashboard = colored(dashboard, "green")
+        sys.stdout.write(f"{header}\n{dashboard}\n")
 
         # print(dashboard)
 
@@ -398,81 +579,19 @@ class Flow:
         # dynamic_prompt = self.construct_dynamic_prompt()
         # combined_prompt = f"{dynamic_prompt}\n{task}"
 
-        # Activate Autonomous agent message
-        self.activate_autonomous_agent()
-
-        response = task  # or combined_prompt
-        history = [f"{self.user_name}: {task}"]
-
-        # If dashboard = True then print the dashboard
-        if self.dashboard:
-            self.print_dashboard(task)
-
-        loop_count = 0
-        # for i in range(self.max_loops):
-        while self.max_loops == "auto" or loop_count < self.max_loops:
-            loop_count += 1
-            print(colored(f"\nLoop {loop_count} of {self.max_loops}", "blue"))
-            print("\n")
-
-            if self.stopping_token:
-                if self._check_stopping_condition(response) or parse_done_token(
-                    response
-                ):
-                    break
-
-            # Adjust temperature, comment if no work
-            if self.dynamic_temperature:
-                self.dynamic_temperature()
-
-            # Preparing the prompt
-            task = self.agent_history_prompt(FLOW_SYSTEM_PROMPT, response)
-
-            attempt = 0
-            while attempt < self.retry_attempts:
-                try:
-                    response = self.llm(
-                        task,
-                        **kwargs,
-                    )
-                    # If there are any tools then parse and execute them
-                    # if self.tools:
-                    #     self.parse_and_execute_tools(response)
-
-                    if self.interactive:
-                        print(f"AI: {response}")
-                        history.append(f"AI: {response}")
-                        response = input("You: ")
-                        history.append(f"Human: {response}")
-                    else:
-                        print(f"AI: {response}")
-                        history.append(f"AI: {response}")
-                        print(response)
-                    break
-                except Exception as e:
-                    logging.error(f"Error generating response: {e}")
-                    attempt += 1
-                    time.sleep(self.retry_interval)
-            history.append(response)
-            time.sleep(self.loop_interval)
-        self.memory.append(history)
-
-        if self.autosave:
-            save_path = self.saved_state_path or "flow_state.json"
-            print(colored(f"Autosaving flow state to {save_path}", "green"))
-            self.save_state(save_path)
-
-        if self.return_history:
-            return response, history
+        # A single loop implementation, the sync entrypoint drives arun
+        return run_sync(self.arun(task, **kwargs))
 
-        return response
-
-    async def arun(self, task: str, **kwargs):
+    async def arun(
+        self, task: str, cancel_event: Optional[threading.Event] = None, **kwargs
+    ):
         """
         Run the autonomous agent loop aschnronously
 
         Args:
             task (str): The initial task to run
+            cancel_event (threading.Event): Optional, once set the loop stops
+                before its next llm call and the run is left out of memory
 
         Flow:
         1. Generate a response
@@ -492,45 +611,65 @@ class Flow:
         if self.dashboard:
             self.print_dashboard(task)
 
-        loop_count = 0
-        # for i in range(self.max_loops):
-        while self.max_loops == "auto" or loop_count < self.max_loops:
-            loop_count += 1
+        # Resolve "auto" once instead of comparing against it every loop
+        loop_counts = (
+            itertools.count(1)
+            if self.max_loops == "auto"
+            else range(1, int(self.max_loops) + 1)
+        )
+        for loop_count in loop_counts:
+            if cancel_event is not None and cancel_event.is_set():
+                break
+
             print(colored(f"\nLoop {loop_count} of {self.max_loops}", "blue"))
             print("\n")
 
-            if self._check_stopping_condition(response) or parse_done_token(response):
+            if self._check_stopping_condition(response) or self._check_stop_token(
+                response
+            ):
                 break
 
             # Adjust temperature, comment if no work
             if self.dynamic_temperature:
-                self.dynamic_temperature()
+                self._apply_dynamic_temperature()
 
-            # Preparing the prompt
-            task = self.agent_history_prompt(FLOW_SYSTEM_PROMPT, response)
+            # Preparing the prompt from the conversation window, joined once
+            task = self.agent_history_prompt(
+                FLOW_SYSTEM_PROMPT, "\n".join(history[-self.context_length :])
+            )
 
             attempt = 0
             while attempt < self.retry_attempts:
                 try:
-                    response = self.llm(
-                        task**kwargs,
-                    )
+                    # The llm clients are blocking, run them off the event loop
+                    response = await asyncio.to_thread(self.llm, task, **kwargs)
+                    # If there are any tools then parse and execute them
+                    # if self.tools:
+                    #     self.parse_and_execute_tools(response)
+
+                    sys.stdout.write(f"AI: {response}\n")
+                    history.append(f"AI: {response}")
                     if self.interactive:
-                        print(f"AI: {response}")
-                        history.append(f"AI: {response}")
                         response = input("You: ")
                         history.append(f"Human: {response}")
-                    else:
-                        print(f"AI: {response}")
-                        history.append(f"AI: {response}")
-                        print(response)
                     break
                 except Exception as e:
-                    logging.error(f"Error generating response: {e}")
+                    logger.error(f"Error generating response: {e}")
+                    if not is_retryable(e):
+                        raise
                     attempt += 1
-                    time.sleep(self.retry_interval)
-            history.append(response)
-            time.sleep(self.loop_interval)
+                    if attempt < self.retry_attempts:
+                        await asyncio.sleep(
+                            backoff_delay(
+                                self.retry_interval, attempt, self.max_retry_delay
+                            )
+                        )
+            await asyncio.sleep(self.loop_interval)
+
+        # A cancelled run has already been reported as timed out
+        if cancel_event is not None and cancel_event.is_set():
+            return response
+
         self.memory.append(history)
 
         if self.autosave:
@@ -547,7 +686,7 @@ class Flow:
         """Generate a result using the provided keyword args."""
         task = self.format_prompt(**kwargs)
         response, history = self._generate(task, task)
-        logging.info(f"Message history: {history}")
+        logger.info(f"Message history: {history}")
         return response
 
     def agent_history_prompt(
@@ -566,27 +705,71 @@ class Flow:
             str: The agent history prompt
         """
         system_prompt = system_prompt or self.system_prompt
-        agent_history_prompt = f"""
-            SYSTEM_PROMPT: {system_prompt}
+        return "".join(
+            (history_prompt_prefix(system_prompt), str(history), "\n        ")
+        )
 
-            History: {history}
+    async def run_concurrent(
+        self, tasks: List[str], max_in_flight: int = 8, **kwargs
+    ) -> AsyncIterator[str]:
         """
-        return agent_history_prompt
+        Run a batch of tasks concurrently, yielding each response as soon as it completes.
 
-    async def run_concurrent(self, tasks: List[str], **kwargs):
-        """
-        Run a batch of tasks concurrently and handle an infinite level of task inputs.
+        At most max_in_flight tasks run at once; a queued task starts as soon as
+        a running one finishes instead of waiting for the whole batch.
 
         Args:
             tasks (List[str]): A list of tasks to run.
+            max_in_flight (int): The maximum number of tasks running at once.
+
+        Example:
+        >>> async for response in flow.run_concurrent(tasks):
+        ...     print(response)
+        """
+        queued = deque(tasks)
+        running = set()
+
+        try:
+            while queued or running:
+                while queued and len(running) < max_in_flight:
+                    running.add(
+                        asyncio.ensure_future(self.arun(queued.popleft(), **kwargs))
+                    )
+
+                done, running = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for completed in done:
+                    yield completed.result()
+        finally:
+            # The consumer stopped early or a task failed
+            for pending in running:
+                pending.cancel()
+
+    def bulk_run(
+        self, inputs: List[Dict[str, Any]], **kwargs
+    ) -> List[Union[str, Exception]]:
+        """
+        Generate responses for multiple input sets concurrently.
+
+        The slot of a failed run holds its exception, see abulk_run.
+        """
+        return run_sync(self.abulk_run(inputs, **kwargs))
+
+    async def abulk_run(
+        self, inputs: List[Dict[str, Any]], **kwargs
+    ) -> List[Union[str, Exception]]:
         """
-        task_coroutines = [self.run_async(task, **kwargs) for task in tasks]
-        completed_tasks = await asyncio.gather(*task_coroutines)
-        return completed_tasks
+        Generate responses for multiple input sets concurrently.
 
-    def bulk_run(self, inputs: List[Dict[str, Any]]) -> List[str]:
-        """Generate responses for multiple input sets."""
-        return [self.run(**input_data) for input_data in inputs]
+        Failed runs are returned in place as their exception instead of
+        cancelling the rest of the batch, so check each result with
+        isinstance(result, Exception) before using it as a string.
+        """
+        return await asyncio.gather(
+            *(self.arun(**input_data, **kwargs) for input_data in inputs),
+            return_exceptions=True,
+        )
 
     @staticmethod
     def from_llm_and_template(llm: Any, template: str) -> "Flow":
@@ -601,8 +784,7 @@ class Flow:
         return Flow(llm=llm, template=template)
 
     def save(self, file_path) -> None:
-        with open(file_path, "w") as f:
-            json.dump(self.memory, f)
+        write_json(file_path, self.memory)
         print(f"Saved flow history to {file_path}")
 
     def load(self, file_path: str):
@@ -612,8 +794,7 @@ class Flow:
         Args:
             file_path (str): The path to the file containing the saved flow history.
         """
-        with open(file_path, "r") as f:
-            self.memory = json.load(f)
+        self.memory = load_json(Path(file_path).read_bytes())
         print(f"Loaded flow history from {file_path}")
 
     def validate_response(self, response: str) -> bool:
@@ -628,18 +809,29 @@ class Flow:
         Prints the entire history and memory of the flow.
         Each message is colored and formatted for better readability.
         """
-        print(colored("Flow History and Memory", "cyan", attrs=["bold"]))
-        print(colored("========================", "cyan", attrs=["bold"]))
+        parts = [
+            HISTORY_COLORS["title"].format("Flow History and Memory"),
+            "\n",
+            HISTORY_COLORS["title"].format("========================"),
+            "\n",
+        ]
         for loop_index, history in enumerate(self.memory, start=1):
-            print(colored(f"\nLoop {loop_index}:", "yellow", attrs=["bold"]))
+            parts.append(HISTORY_COLORS["loop"].format(f"\nLoop {loop_index}:"))
+            parts.append("\n")
             for message in history:
                 speaker, _, message_text = message.partition(": ")
-                if "Human" in speaker:
-                    print(colored(f"{speaker}:", "green") + f" {message_text}")
-                else:
-                    print(colored(f"{speaker}:", "blue") + f" {message_text}")
-            print(colored("------------------------", "cyan"))
-        print(colored("End of Flow History", "cyan", attrs=["bold"]))
+                speaker_color = HISTORY_COLORS[
+                    "human" if "Human" in speaker else "agent"
+                ]
+                parts.append(f"{speaker_color.format(speaker + ':')} {message_text}\n")
+            parts.append(HISTORY_COLORS["rule"].format("------------------------"))
+            parts.append("\n")
+        parts.append(HISTORY_COLORS["title"].format("End of Flow History"))
+        parts.append("\n")
+
+        # One write for the whole history instead of a print per message
+        sys.stdout.write("".join(parts))
+        sys.stdout.flush()
 
     def step(self, task: str, **kwargs):
         """
@@ -670,7 +862,7 @@ class Flow:
 
             return response
         except Exception as error:
-            logging.error(f"Error generating response: {error}")
+            logger.error(f"Error generating response: {error}")
             raise
 
     def graceful_shutdown(self):
@@ -680,13 +872,29 @@ class Flow:
 
     def run_with_timeout(self, task: str, timeout: int = 60) -> str:
         """Run the loop but stop if it takes longer than the timeout"""
-        start_time = time.time()
-        response = self.run(task)
-        end_time = time.time()
-        if end_time - start_time > timeout:
-            print("Operaiton timed out")
+        # Scoped to this run so other runs of the flow are not stopped
+        cancel_event = threading.Event()
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(self.run, task, cancel_event=cancel_event)
+        # Do not wait for a timed out run when returning
+        executor.shutdown(wait=False)
+
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            # The llm call in flight cannot be interrupted, so the loop stops
+            # before its next call
+            cancel_event.set()
+            print("Operation timed out")
+            return "Timeout"
+
+    async def arun_with_timeout(self, task: str, timeout: int = 60) -> str:
+        """Run the loop asynchronously, cancelling it after the timeout"""
+        try:
+            return await asyncio.wait_for(self.arun(task), timeout=timeout)
+        except asyncio.TimeoutError:
+            print("Operation timed out")
             return "Timeout"
-        return response
 
     # def backup_memory_to_s3(self, bucket_name: str, object_name: str):
     #     """Backup the memory to S3"""
@@ -698,13 +906,8 @@ class Flow:
 
     def analyze_feedback(self):
         """Analyze the feedback for issues"""
-        feedback_counts = {}
-        for feedback in self.feedback:
-            if feedback in feedback_counts:
-                feedback_counts[feedback] += 1
-            else:
-                feedback_counts[feedback] = 1
-        print(f"Feedback counts: {feedback_counts}")
+        feedback_counts = Counter(self.feedback)
+        print(f"Feedback counts: {dict(feedback_counts)}")
 
     def undo_last(self) -> Tuple[str, str]:
         """
@@ -739,17 +942,20 @@ class Flow:
 
 
         """
-        self.reponse_filters.append(filter_word)
+        self.response_filters.append(filter_word)
 
-    def apply_reponse_filters(self, response: str) -> str:
+    def apply_response_filters(self, response: str) -> str:
         """
         Apply the response filters to the response
 
 
         """
-        for word in self.response_filters:
-            response = response.replace(word, "[FILTERED]")
-        return response
+        # Keyed on the current filters, so edits to response_filters made
+        # directly are picked up too
+        pattern = response_filter_pattern(tuple(self.response_filters))
+        if pattern is None:
+            return response
+        return pattern.sub("[FILTERED]", response)
 
     def filtered_run(self, task: str) -> str:
         """
@@ -785,43 +991,36 @@ class Flow:
         print(response)
 
         """
-        tokens = list(prompt)
-        response = ""
-        for token in tokens:
-            time.sleep(0.1)
-            response += token
-            print(token, end="", flush=True)
-        print()
-        return response
+        tokens = []
+        for token in prompt:
+            tokens.append(token)
+            sys.stdout.write(token)
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+        return "".join(tokens)
 
     def get_llm_params(self):
         """
         Extracts and returns the parameters of the llm object for serialization.
-        It assumes that the llm object has an __init__ method
-        with parameters that can be used to recreate it.
+        It snapshots the llm's public instance attributes, falling back to its
+        __init__ parameters for slotted classes without an instance dict.
+        API keys, tokens and client objects are left out.
         """
-        if not hasattr(self.llm, "__init__"):
-            return None
-
-        init_signature = inspect.signature(self.llm.__init__)
-        params = init_signature.parameters
-        llm_params = {}
-
-        for name, param in params.items():
-            if name == "self":
-                continue
-            if hasattr(self.llm, name):
-                value = getattr(self.llm, name)
-                if isinstance(
-                    value, (str, int, float, bool, list, dict, tuple, type(None))
-                ):
-                    llm_params[name] = value
-                else:
-                    llm_params[name] = str(
-                        value
-                    )  # For non-serializable objects, save their string representation.
-
-        return llm_params
+        attributes = getattr(self.llm, "__dict__", None)
+        if not attributes:
+            attributes = {
+                name: getattr(self.llm, name)
+                for name in llm_init_param_names(type(self.llm))
+                if hasattr(self.llm, name)
+            }
+
+        # For non-serializable objects, save their string representation.
+        return {
+            name: value if isinstance(value, JSON_SAFE_TYPES) else str(value)
+            for name, value in attributes.items()
+            if not name.startswith("_")
+            and not PRIVATE_LLM_PARAM_PATTERN.search(name)
+        }
 
     def save_state(self, file_path: str) -> None:
         """
@@ -844,8 +1043,7 @@ class Flow:
             "dynamic_temperature": self.dynamic_temperature,
         }
 
-        with open(file_path, "w") as f:
-            json.dump(state, f, indent=4)
+        write_json(file_path, state, indent=True)
 
         saved = colored("Saved flow state to", "green")
         print(f"{saved} {file_path}")
@@ -861,8 +1059,7 @@ class Flow:
         >>> flow.run("Continue with the task")
 
         """
-        with open(file_path, "r") as f:
-            state = json.load(f)
+        state = load_json(Path(file_path).read_bytes())
 
         # Restore other saved attributes
         self.memory = state.get("memory", [])
@@ -872,34 +1069,69 @@ class Flow:
         self.retry_interval = state.get("retry_interval", 1)
         self.interactive = state.get("interactive", False)
 
-        print(f"Flow state loaded from {file_path}")
+        logger.info(f"Flow state loaded from {file_path}")
+
+    def retry_on_failure(
+        self,
+        function,
+        retries: int = 3,
+        retry_delay: int = 1,
+        retry_on: Tuple[type, ...] = (TimeoutError, ConnectionError),
+    ):
+        """Retry wrapper for LLM calls, with exponential backoff and full jitter."""
+        if retries < 1:
+            raise ValueError(f"retries must be at least 1, got {retries}")
 
-    def retry_on_failure(self, function, retries: int = 3, retry_delay: int = 1):
-        """Retry wrapper for LLM calls."""
-        attempt = 0
-        while attempt < retries:
+        for attempt in range(1, retries + 1):
             try:
                 return function()
-            except Exception as error:
-                logging.error(f"Error generating response: {error}")
-                attempt += 1
-                time.sleep(retry_delay)
-        raise Exception("All retry attempts failed")
+            except retry_on as error:
+                logger.error(f"Error generating response: {error}")
+                if attempt == retries:
+                    raise
+                time.sleep(
+                    backoff_delay(
+                        retry_delay, attempt, self.max_retry_delay, jitter="full"
+                    )
+                )
 
-    def generate_reply(self, history: str, **kwargs) -> str:
+    def generate_reply(self, history: Union[str, List[str]], **kwargs) -> str:
         """
         Generate a response based on initial or task
         """
-        prompt = f"""
+        response = "".join(self.generate_reply_stream(history, **kwargs))
+        return {"role": self.agent_name, "content": response}
 
-        SYSTEM_PROMPT: {self.system_prompt}
+    def generate_reply_stream(
+        self, history: Union[str, List[str]], **kwargs
+    ) -> Iterator[str]:
+        """
+        Yield the response to the history as the llm generates it
 
-        History: {history}
+        llms that set supports_streaming are called with stream=True, llms with a
+        stream method are streamed through it, any other llm yields its whole
+        response at once.
 
-        Your response:
+        Example:
+        >>> for chunk in flow.generate_reply_stream("Human: Hello"):
+        ...     print(chunk, end="", flush=True)
         """
-        response = self.llm(prompt, **kwargs)
-        return {"role": self.agent_name, "content": response}
+        if not isinstance(history, str):
+            # A list of messages is joined once here instead of by the caller
+            history = "\n".join(history)
+        prompt = "".join(
+            (reply_prompt_prefix(self.system_prompt), history, REPLY_PROMPT_SUFFIX)
+        )
+
+        if getattr(self.llm, "supports_streaming", False):
+            chunks = self.llm(prompt, stream=True, **kwargs)
+        elif callable(getattr(self.llm, "stream", None)):
+            chunks = self.llm.stream(prompt, **kwargs)
+        else:
+            chunks = [self.llm(prompt, **kwargs)]
+
+        for chunk in chunks:
+            yield chunk if isinstance(chunk, str) else str(chunk)
 
     def update_system_prompt(self, system_prompt: str):
         """Upddate the system message"""
@@ -1,4 +1,5 @@
 import os
+from itertools import cycle, islice
 from typing import Callable, List
 
 
@@ -38,20 +39,18 @@ class DialogueSimulator:
                     agent.run(prompt)
                 step += 1
 
-            while step < self.max_iters:
-                speaker_idx = step % len(self.agents)
-                speaker = self.agents[speaker_idx]
+            # Speakers take turns in order, continuing from the current step
+            for speaker in islice(cycle(self.agents), step, self.max_iters):
                 speaker_message = speaker.run(prompt)
 
+                message_history = (
+                    f"Speaker Name: {speaker.name} and message: {speaker_message}"
+                )
                 for receiver in self.agents:
-                    message_history = (
-                        f"Speaker Name: {speaker.name} and message: {speaker_message}"
-                    )
                     receiver.run(message_history)
 
                 print(f"({speaker.name}): {speaker_message}")
                 print("\n")
-                step += 1
         except Exception as error:
             print(f"Error running dialogue simulator: {error}")
 
@@ -1,16 +1,33 @@
 import asyncio
+import hashlib
+import json
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Callable, List
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Iterator, List, Literal, Tuple, Union
 
 from tabulate import tabulate
 from termcolor import colored
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def dump_json_line(obj) -> bytes:
+    """One JSON line, with orjson when installed, failed responses as strings"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, default=str) + "\n").encode()
+
+
 class GodMode:
     """
     GodMode
@@ -24,7 +41,7 @@ class GodMode:
     4. GodMode prints the responses from all LLMs.
 
     Parameters:
-    llms: list of LLMs
+    llms: list of LLMs, or a dict of them keyed by name
 
     Methods:
     run(task): distribute task to all LLMs and collect responses
@@ -40,62 +57,213 @@ class GodMode:
 
     def __init__(
         self,
-        llms: List[Callable],
+        llms: Union[List[Callable], Dict[str, Callable]],
         load_balancing: bool = False,
         retry_attempts: int = 3,
+        cache_enabled: bool = False,
+        cache_size: int = 1000,
+        max_concurrency: int = None,
+        history_limit: int = None,
     ):
-        self.llms = llms
+        # Registered llms keyed by name; a list is keyed by each llm's name
+        # attribute, falling back to llm_<index>
+        self._llms: Dict[str, Callable] = {}
+        if isinstance(llms, dict):
+            self._llms.update(llms)
+        else:
+            for i, llm in enumerate(llms):
+                self._register(llm, getattr(llm, "name", None) or f"llm_{i}")
         self.load_balancing = load_balancing
         self.retry_attempts = retry_attempts
         self.last_responses = None
-        self.task_history = []
+        # (responses, rendered table) of the last table printed
+        self._last_render = None
+        # Only the most recent history_limit tasks are kept
+        self.history_limit = history_limit or 1000
+        self.task_history = deque(maxlen=self.history_limit)
+        # Reused across calls instead of spawning threads for every task
+        self.max_workers = max(4, len(self._llms))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # Opt-in, since sampling llms should not repeat themselves. Responses
+        # are keyed by (registered name, sha256(task)), in LRU order
+        self.cache_enabled = cache_enabled
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        # Caps the llm calls arun has in flight at once
+        self.max_concurrency = max_concurrency or int(
+            os.environ.get("SWARMS_MAX_CONCURRENCY", 8)
+        )
+
+    @property
+    def llms(self) -> List[Callable]:
+        """The registered llms, in registration order"""
+        return list(self._llms.values())
+
+    def _register(self, llm: Callable, name: str) -> str:
+        """Register an llm under name, suffixing the name if it is taken"""
+        unique_name, suffix = name, 1
+        while unique_name in self._llms:
+            suffix += 1
+            unique_name = f"{name}_{suffix}"
+        self._llms[unique_name] = llm
+        return unique_name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Shut down the worker threads"""
+        self.executor.shutdown(wait=True)
+
+    def __del__(self):
+        # Instances not closed or used as a context manager still release
+        # their pool; getattr since __init__ may have failed before it
+        executor = getattr(self, "executor", None)
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def call_llm(self, name: str, task: str):
+        """Call a registered llm on a task, serving repeated tasks from the cache"""
+        llm = self._llms[name]
+        if not self.cache_enabled:
+            return llm(task)
+
+        key = (name, hashlib.sha256(task.encode()).hexdigest())
+        with self.cache_lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+        response = llm(task)
+
+        with self.cache_lock:
+            # The llm may have been removed, or its name reused, mid-call
+            if self._llms.get(name) is not llm:
+                return response
+            self.cache[key] = response
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return response
+
+    def clear_cache(self):
+        """Clear the cached responses"""
+        with self.cache_lock:
+            self.cache.clear()
 
-    def run(self, task: str):
-        """Run the task string"""
-        with ThreadPoolExecutor() as executor:
-            responses = executor.map(lambda llm: llm(task), self.llms)
-        return list(responses)
+    def _result_or_error(self, name: str, future: Future) -> Union[str, Exception]:
+        """The future's response, or its exception if the llm failed"""
+        try:
+            return future.result()
+        except Exception as error:
+            logger.exception("LLM %s failed", name)
+            return error
+
+    def run(self, task: str) -> List[Union[str, Exception]]:
+        """
+        Run the task string, returning the responses in llm order
+
+        A failed llm's slot holds its exception, as in concurrent_run and arun.
+        """
+        future_to_index = {
+            self.executor.submit(self.call_llm, name, task): (i, name)
+            for i, name in enumerate(self._llms)
+        }
+        responses = [None] * len(future_to_index)
+        # Collect in completion order so failures are logged without
+        # waiting on the slower calls
+        for future in as_completed(future_to_index):
+            i, name = future_to_index[future]
+            responses[i] = self._result_or_error(name, future)
+        return responses
+
+    def run_stream(
+        self, task: str
+    ) -> Iterator[Tuple[Callable, Union[str, Exception]]]:
+        """Yield (llm, response) pairs as each llm finishes, failures as their exception"""
+        future_to_name = {
+            self.executor.submit(self.call_llm, name, task): name for name in self._llms
+        }
+        for future in as_completed(future_to_name):
+            name = future_to_name[future]
+            yield self._llms.get(name), self._result_or_error(name, future)
 
     def print_responses(self, task):
         """Prints the responses in a tabular format"""
-        responses = self.run_all(task)
-        table = []
-        for i, response in enumerate(responses):
-            table.append([f"LLM {i+1}", response])
-        print(
-            colored(
-                tabulate(table, headers=["LLM", "Response"], tablefmt="pretty"), "cyan"
-            )
-        )
+        self.print_table(self.run_all(task))
 
     def run_all(self, task):
         """Run the task on all LLMs"""
-        responses = []
-        for llm in self.llms:
-            responses.append(llm(task))
-        return responses
+        return self.concurrent_run(task)
 
     def print_arun_all(self, task):
-        """Prints the responses in a tabular format"""
-        responses = self.arun_all(task)
+        """
+        Prints the responses of arun in a tabular format
+
+        Inside a running event loop (e.g. Jupyter) the printing is scheduled as
+        a task, which is returned; await god_mode.arun(task) directly there to
+        get the responses.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.print_table(asyncio.run(self.arun(task)))
+            return None
+
+        return loop.create_task(self._aprint_arun_all(task))
+
+    async def _aprint_arun_all(self, task):
+        self.print_table(await self.arun(task))
+
+    def print_table(self, responses):
+        """Prints responses in a tabular format"""
+        print(self._render_table(responses))
+
+    def _render_table(self, responses) -> str:
+        """Render responses as a colored table, reusing the last render for the same list"""
+        if self._last_render is not None and self._last_render[0] is responses:
+            return self._last_render[1]
+
         table = []
-        for i, response in enumerate(responses):
-            table.append([f"LLM {i+1}", response])
-        print(
-            colored(
-                tabulate(table, headers=["LLM", "Response"], tablefmt="pretty"), "cyan"
-            )
+        for name, response in zip(self._llms, responses):
+            table.append([name, response])
+        rendered = colored(
+            tabulate(table, headers=["LLM", "Response"], tablefmt="pretty"), "cyan"
         )
+        self._last_render = (responses, rendered)
+        return rendered
 
     # New Features
-    def save_responses_to_file(self, filename):
-        """Save responses to file"""
-        with open(filename, "w") as file:
+    def save_responses_to_file(
+        self, filename, format: Literal["jsonl", "table"] = "jsonl"
+    ):
+        """
+        Save responses to file
+
+        Args:
+            filename (str): The file to write
+            format (str): "jsonl" for one {"llm", "response"} object per line,
+                "table" for the tabulate rendering. Defaults to "jsonl".
+        """
+        if format == "table":
             table = [
-                [f"LLM {i+1}", response]
-                for i, response in enumerate(self.last_responses)
+                [name, response]
+                for name, response in zip(self._llms, self.last_responses)
             ]
-            file.write(tabulate(table, headers=["LLM", "Response"]))
+            content = tabulate(table, headers=["LLM", "Response"])
+            with open(filename, "w", buffering=1 << 20) as file:
+                file.write(content)
+            return
+
+        lines = b"".join(
+            dump_json_line({"llm": name, "response": response})
+            for name, response in zip(self._llms, self.last_responses)
+        )
+        with open(filename, "wb", buffering=1 << 20) as file:
+            file.write(lines)
 
     @classmethod
     def load_llms_from_file(cls, filename):
@@ -106,7 +274,11 @@ class GodMode:
 
     def get_task_history(self):
         """Get Task history"""
-        return self.task_history
+        return list(self.task_history)
+
+    def clear_history(self):
+        """Clear the task history"""
+        self.task_history.clear()
 
     def summary(self):
         """Summary"""
@@ -114,14 +286,11 @@ class GodMode:
         for i, task in enumerate(self.task_history):
             print(f"{i + 1}. {task}")
         print("\nLast Responses:")
-        table = [
-            [f"LLM {i+1}", response] for i, response in enumerate(self.last_responses)
-        ]
-        print(
-            colored(
-                tabulate(table, headers=["LLM", "Response"], tablefmt="pretty"), "cyan"
-            )
-        )
+        self.print_table(self.last_responses)
+
+    def set_max_concurrency(self, max_concurrency: int):
+        """Set how many llm calls arun runs at once"""
+        self.max_concurrency = max_concurrency
 
     def enable_load_balancing(self):
         """Enable load balancing among LLMs."""
@@ -134,32 +303,119 @@ class GodMode:
         logger.info("Load balancing disabled.")
 
     async def arun(self, task: str):
-        """Asynchronous run the task string"""
-        loop = asyncio.get_event_loop()
-        futures = [
-            loop.run_in_executor(None, lambda llm: llm(task), llm) for llm in self.llms
+        """Asynchronous run the task string on all llms and collect responses"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        loop = asyncio.get_running_loop()
+
+        async def run_llm(name):
+            async with semaphore:
+                return await loop.run_in_executor(
+                    self.executor, self.call_llm, name, task
+                )
+
+        # Each llm is bound as an argument, and a failing llm returns its
+        # exception in place instead of cancelling the others
+        names = list(self._llms)
+        responses = await asyncio.gather(
+            *(run_llm(name) for name in names), return_exceptions=True
+        )
+        for name, response in zip(names, responses):
+            if isinstance(response, Exception):
+                logger.error("LLM %s failed", name, exc_info=response)
+        self.last_responses = responses
+        self._last_render = None
+        self.task_history.append(task)
+        return responses
+
+    def concurrent_run(self, task: str) -> List[Union[str, Exception]]:
+        """
+        Synchronously run the task on all llms and collect responses
+
+        Responses are returned in llm order; a failed llm's slot holds its
+        exception so the positions still line up with the llms.
+        """
+        pairs = [
+            (name, self.executor.submit(self.call_llm, name, task))
+            for name in self._llms
         ]
-        for response in await asyncio.gather(*futures):
-            print(response)
-
-    def concurrent_run(self, task: str) -> List[str]:
-        """Synchronously run the task on all llms and collect responses"""
-        with ThreadPoolExecutor() as executor:
-            future_to_llm = {executor.submit(llm, task): llm for llm in self.llms}
-            responses = []
-            for future in as_completed(future_to_llm):
-                try:
-                    responses.append(future.result())
-                except Exception as error:
-                    print(f"{future_to_llm[future]} generated an exception: {error}")
+        responses = [None] * len(pairs)
+        for i, (name, future) in enumerate(pairs):
+            responses[i] = self._result_or_error(name, future)
         self.last_responses = responses
+        self._last_render = None
         self.task_history.append(task)
         return responses
 
-    def add_llm(self, llm: Callable):
-        """Add an llm to the god mode"""
-        self.llms.append(llm)
+    def run_many(self, tasks: List[str]) -> List[List[Union[str, Exception]]]:
+        """Run every task on all llms, returning each llm's responses in task order"""
+        return self.concurrent_run_many(tasks)
+
+    def concurrent_run_many(
+        self, tasks: List[str]
+    ) -> List[List[Union[str, Exception]]]:
+        """
+        Run a list of tasks on all llms
+
+        llms with a batch (or generate_batch) method get the whole list in one
+        call so the backend can batch it; the rest get one call per task on the
+        executor. A failed call's slots hold its exception.
+        """
+        futures = []
+        names = list(self._llms)
+        for name, llm in self._llms.items():
+            batch = getattr(llm, "batch", None) or getattr(llm, "generate_batch", None)
+            if batch is not None:
+                futures.append(self.executor.submit(batch, tasks))
+            else:
+                futures.append(
+                    [self.executor.submit(self.call_llm, name, task) for task in tasks]
+                )
+
+        responses = []
+        for name, future in zip(names, futures):
+            if isinstance(future, list):
+                responses.append(
+                    [self._result_or_error(name, task_future) for task_future in future]
+                )
+                continue
+
+            batch_responses = self._result_or_error(name, future)
+            if isinstance(batch_responses, Exception):
+                responses.append([batch_responses] * len(tasks))
+            else:
+                responses.append(list(batch_responses))
+        return responses
+
+    def add_llm(self, llm: Callable, name: str = None) -> str:
+        """Add an llm to the god mode, returning the name it is registered under"""
+        name = self._register(
+            llm, name or getattr(llm, "name", None) or f"llm_{len(self._llms)}"
+        )
+        self._last_render = None
+
+        # Grow the pool once it can no longer run every llm at the same time
+        if len(self._llms) > self.max_workers:
+            self.max_workers = len(self._llms) * 2
+            previous_executor = self.executor
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            previous_executor.shutdown(wait=False)
+        return name
+
+    def remove_llm(self, name_or_llm: Union[str, Callable]) -> Callable:
+        """Remove an llm from the god mode by its registered name or by identity"""
+        self._last_render = None
+        if isinstance(name_or_llm, str) and name_or_llm in self._llms:
+            name = name_or_llm
+        else:
+            name = next(
+                (name for name, llm in self._llms.items() if llm is name_or_llm), None
+            )
+            if name is None:
+                raise KeyError(f"Unknown llm {name_or_llm!r}")
 
-    def remove_llm(self, llm: Callable):
-        """Remove an llm from the god mode"""
-        self.llms.remove(llm)
+        llm = self._llms.pop(name)
+        # A later llm registered under the same name must not get these
+        with self.cache_lock:
+            for key in [key for key in self.cache if key[0] == name]:
+                del self.cache[key]
+        return llm
@@ -1,26 +1,45 @@
+import logging
+
 from swarms.tools.tool import tool
 from typing import Dict, Callable, Any, List
 
+logger = logging.getLogger(__name__)
+
 ToolBuilder = Callable[[Any], tool]
 FuncToolBuilder = Callable[[], ToolBuilder]
 
 
 class ToolsRegistry:
+    __slots__ = ("tools", "_builders")
+
     def __init__(self) -> None:
         self.tools: Dict[str, FuncToolBuilder] = {}
+        # ToolBuilders returned by each registered factory, created on first build
+        self._builders: Dict[str, ToolBuilder] = {}
 
     def register(self, tool_name: str, tool: FuncToolBuilder):
-        print(f"will register {tool_name}")
+        logger.debug(f"will register {tool_name}")
         self.tools[tool_name] = tool
+        self._builders.pop(tool_name, None)
 
     def build(self, tool_name, config):
-        ret = self.tools[tool_name]()(config)
+        builder = self._builders.get(tool_name)
+        if builder is None:
+            factory = self.tools.get(tool_name)
+            if factory is None:
+                raise KeyError(f"Unknown tool {tool_name!r}; known={list(self.tools)}")
+            builder = self._builders[tool_name] = factory()
+
+        ret = builder(config)
         if isinstance(ret, tool):
             return ret
         raise ValueError(
             "Tool builder {} did not return a Tool instance".format(tool_name)
         )
 
+    def __contains__(self, tool_name: str) -> bool:
+        return tool_name in self.tools
+
     def list_tools(self) -> List[str]:
         return list(self.tools.keys())
 
@@ -37,7 +56,7 @@ def register(tool_name):
 
 
 def build_tool(tool_name: str, config: Any) -> tool:
-    print(f"will build {tool_name}")
+    logger.debug(f"will build {tool_name}")
     return tools_registry.build(tool_name, config)
 
 
@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import hashlib
 
@@ -14,3 +15,9 @@ def str_to_hash(text: str, hash_algorithm: str = "sha256") -> str:
     m.update(text.encode())
 
     return m.hexdigest()
+
+
+def vector_to_hash(vector: list[float]) -> str:
+    return hashlib.blake2b(
+        np.asarray(vector, dtype=np.float32).tobytes(), digest_size=16
+    ).hexdigest()
@@ -0,0 +1,180 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from swarms.memory import PineconeVectorStore
+
+api_key = os.getenv("PINECONE_API_KEY") or ""
+
+
+@pytest.fixture(autouse=True)
+def clear_index_cache():
+    PineconeVectorStore._index_cache.clear()
+
+
+@pytest.fixture
+def embedding_driver():
+    driver = MagicMock()
+    driver.embed_string.return_value = [1.0, 0.0, 0.0]
+    driver.dimensions = 3
+    return driver
+
+
+def test_init(embedding_driver):
+    with patch("pinecone.init") as MockInit, patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        MockInit.assert_called_once()
+        MockIndex.assert_called_once()
+        assert store.index == MockIndex.return_value
+
+
+def test_init_reuses_index(embedding_driver):
+    with patch("pinecone.init") as MockInit, patch("pinecone.Index") as MockIndex:
+        first = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        second = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        MockInit.assert_called_once()
+        MockIndex.assert_called_once()
+        assert first.index is second.index
+
+
+def test_init_keys_index_by_pool_threads(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key,
+            index_name="test_index",
+            environment="test_env",
+            pool_threads=4,
+        )
+        assert MockIndex.call_count == 2
+
+
+def test_upsert_vector(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        store.upsert_vector(
+            [1.0, 2.0, 3.0], "test_id", "test_namespace", {"meta": "data"}
+        )
+        MockIndex.return_value.upsert.assert_called()
+
+
+def test_upsert_vectors_batches(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        vectors = [(f"id_{i}", [float(i)] * 3, None) for i in range(250)]
+        ids = store.upsert_vectors(vectors, namespace="test_namespace")
+        assert ids == [f"id_{i}" for i in range(250)]
+        assert MockIndex.return_value.upsert.call_count == 3
+
+
+def test_upsert_vectors_splits_by_bytes(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key,
+            index_name="test_index",
+            environment="test_env",
+            max_batch_bytes=1000,
+        )
+        vectors = [(f"id_{i}", [0.5] * 100, None) for i in range(4)]
+        store.upsert_vectors(vectors, namespace="test_namespace")
+        assert MockIndex.return_value.upsert.call_count == 4
+
+
+def test_load_entry(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        store.load_entry("test_id", "test_namespace")
+        MockIndex.return_value.fetch.assert_called()
+
+
+def test_load_entries(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        store.load_entries("test_namespace")
+        MockIndex.return_value.query.assert_called()
+
+
+def test_query(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        store.query("test_query", 10, "test_namespace")
+        MockIndex.return_value.query.assert_called()
+
+
+def test_query_semantic_cache(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key,
+            index_name="test_index",
+            environment="test_env",
+            semantic_cache_size=10,
+        )
+        MockIndex.return_value.query.return_value = {
+            "namespace": "test_namespace",
+            "matches": [],
+        }
+        store.query("test_query", 10, "test_namespace")
+        store.query("test_query", 10, "test_namespace")
+        MockIndex.return_value.query.assert_called_once()
+
+
+def test_query_batch():
+    with patch("pinecone.init"), patch("pinecone.Index") as MockIndex:
+        embedding_driver = MagicMock(spec=["embed_string"])
+        embedding_driver.embed_string.return_value = [1.0, 0.0, 0.0]
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key,
+            index_name="test_index",
+            environment="test_env",
+        )
+        MockIndex.return_value.query.return_value.get.return_value = {
+            "namespace": "test_namespace",
+            "matches": [],
+        }
+        results = store.query_batch(["a", "b"], 10, "test_namespace")
+        assert results == [[], []]
+        assert MockIndex.return_value.query.call_count == 2
+
+
+def test_create_index(embedding_driver):
+    with patch("pinecone.init"), patch("pinecone.Index"), patch(
+        "pinecone.create_index"
+    ) as MockCreateIndex:
+        store = PineconeVectorStore(
+            embedding_driver,
+            api_key=api_key, index_name="test_index", environment="test_env"
+        )
+        store.create_index("test_index")
+        MockCreateIndex.assert_called()
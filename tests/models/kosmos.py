@@ -1,10 +1,17 @@
 from unittest.mock import Mock, patch
 
+import numpy as np
 import pytest
 import requests
+import torch
 
 # This will be your project directory
-from swarms.models.kosmos_two import Kosmos, is_overlapping
+from swarms.models.kosmos_two import (
+    Kosmos,
+    is_overlapping,
+    left_pad_prompts,
+    resolve_overlap,
+)
 
 # A placeholder image URL for testing
 TEST_IMAGE_URL = "https://images.unsplash.com/photo-1673267569891-ca4246caafd7?auto=format&fit=crop&q=60&w=400&ixlib=rb-4.0.3&ixid=M3wxMjA3fDB8MHx0b3BpYy1mZWVkfDM1fEpwZzZLaWRsLUhrfHxlbnwwfHx8fHw%3D"
@@ -28,6 +35,31 @@ def test_is_overlapping():
     assert is_overlapping((0, 0, 2, 2), (1, 1, 2, 2)) is True
 
 
+def test_resolve_overlap():
+    previous = np.array([[0, 0, 10, 10], [0, 11, 10, 20]])
+    assert resolve_overlap((0, 0, 10, 5), previous, 12, 100) == (24, False)
+    assert resolve_overlap((20, 0, 30, 5), previous, 12, 100) == (0, False)
+    assert resolve_overlap((0, 0, 10, 5), previous, 12, 20) == (24, True)
+
+
+def test_left_pad_prompts_different_lengths():
+    def encoded(input_ids):
+        return {
+            "pixel_values": torch.zeros(1, 3, 2, 2),
+            "input_ids": torch.tensor([input_ids]),
+            "attention_mask": torch.ones(1, len(input_ids), dtype=torch.long),
+            "img_attn_mask": torch.ones(1, len(input_ids), dtype=torch.long),
+        }
+
+    # Both prompts end with the eos id 2, the first is two tokens shorter
+    inputs = left_pad_prompts([encoded([0, 5, 2]), encoded([0, 5, 6, 7, 2])], 1)
+
+    assert inputs["pixel_values"].shape == (2, 3, 2, 2)
+    assert inputs["input_ids"].tolist() == [[1, 1, 0, 5], [0, 5, 6, 7]]
+    assert inputs["attention_mask"].tolist() == [[0, 0, 1, 1], [1, 1, 1, 1]]
+    assert inputs["img_attn_mask"].tolist() == [[0, 0, 1, 1], [1, 1, 1, 1]]
+
+
 # Test model initialization
 def test_kosmos_init():
     kosmos = Kosmos()
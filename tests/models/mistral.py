@@ -43,3 +43,14 @@ def test_mistral__stream_response():
     response = "It's sunny in Miami."
     tokens = list(mistral._stream_response(response))
     assert tokens == ["It's", "sunny", "in", "Miami."]
+
+
+def test_mistral_reset_chat():
+    mistral = Mistral(device="cpu")
+    mistral.history = ["message"]
+    mistral.chat_ids = "ids"
+    mistral.past_key_values = "cache"
+    mistral.reset_chat()
+    assert mistral.history == []
+    assert mistral.chat_ids is None
+    assert mistral.past_key_values is None
@@ -1,7 +1,7 @@
 import json
 import os
 from unittest import mock
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from dotenv import load_dotenv
@@ -39,6 +39,14 @@ def test_stop_when_repeats():
     assert not stop_when_repeats("Continue the process")
 
 
+def test_stop_when_repeats_matches_whole_word():
+    assert stop_when_repeats("stop")
+    assert stop_when_repeats("We should STOP.")
+    assert not stop_when_repeats("nonstop")
+    assert not stop_when_repeats("stopwatch")
+    assert not stop_when_repeats("unstoppable")
+
+
 def test_flow_initialization(basic_flow):
     assert basic_flow.max_loops == 5
     assert basic_flow.stopping_condition is None
@@ -58,19 +66,19 @@ def test_provide_feedback(basic_flow):
     assert feedback in basic_flow.feedback
 
 
-@patch("time.sleep", return_value=None)  # to speed up tests
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)  # to speed up tests
 def test_run_without_stopping_condition(mocked_sleep, basic_flow):
     response = basic_flow.run("Test task")
     assert response == "Test task"  # since our mocked llm doesn't modify the response
 
 
-@patch("time.sleep", return_value=None)  # to speed up tests
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)  # to speed up tests
 def test_run_with_stopping_condition(mocked_sleep, flow_with_condition):
     response = flow_with_condition.run("Stop")
     assert response == "Stop"
 
 
-@patch("time.sleep", return_value=None)  # to speed up tests
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)  # to speed up tests
 def test_run_with_exception(mocked_sleep, basic_flow):
     basic_flow.llm.side_effect = Exception("Test Exception")
     with pytest.raises(Exception, match="Test Exception"):
@@ -126,7 +134,7 @@ def test_format_prompt(basic_flow):
 
 
 # Test with max loops
-@patch("time.sleep", return_value=None)
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
 def test_max_loops(mocked_sleep, basic_flow):
     basic_flow.max_loops = 3
     response = basic_flow.run("Looping")
@@ -134,7 +142,7 @@ def test_max_loops(mocked_sleep, basic_flow):
 
 
 # Test stopping token
-@patch("time.sleep", return_value=None)
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
 def test_stopping_token(mocked_sleep, basic_flow):
     basic_flow.stopping_token = "Terminate"
     response = basic_flow.run("Loop until Terminate")
@@ -200,16 +208,19 @@ def test_mocked_openai_chat(MockedOpenAIChat):
 
 
 # Test retry attempts
-@patch("time.sleep", return_value=None)
-def test_retry_attempts(mocked_sleep, basic_flow):
-    basic_flow.retry_attempts = 2
-    basic_flow.llm.side_effect = [Exception("Test Exception"), "Valid response"]
-    response = basic_flow.run("Test retry")
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
+def test_retry_attempts(mocked_sleep):
+    llm = MagicMock(side_effect=[Exception("Test Exception"), "Valid response"])
+    flow = Flow(llm=llm, max_loops=1, retry_attempts=2, loop_interval=0)
+    response = flow.run("Test retry")
     assert response == "Valid response"
+    assert llm.call_count == 2
+    # only the failed attempt's backoff waits
+    assert any(call.args[0] > 0 for call in mocked_sleep.await_args_list)
 
 
 # Test different loop intervals
-@patch("time.sleep", return_value=None)
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
 def test_different_loop_intervals(mocked_sleep, basic_flow):
     basic_flow.loop_interval = 2
     response = basic_flow.run("Test loop interval")
@@ -217,7 +228,7 @@ def test_different_loop_intervals(mocked_sleep, basic_flow):
 
 
 # Test different retry intervals
-@patch("time.sleep", return_value=None)
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
 def test_different_retry_intervals(mocked_sleep, basic_flow):
     basic_flow.retry_interval = 2
     response = basic_flow.run("Test retry interval")
@@ -225,7 +236,7 @@ def test_different_retry_intervals(mocked_sleep, basic_flow):
 
 
 # Test invoking the flow with additional kwargs
-@patch("time.sleep", return_value=None)
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
 def test_flow_call_with_kwargs(mocked_sleep, basic_flow):
     response = basic_flow("Test call", param1="value1", param2="value2")
     assert response == "Test call"
@@ -252,7 +263,7 @@ def test_flow_initialization_all_params(mocked_llm):
 
 
 # Test the stopping token is in the response
-@patch("time.sleep", return_value=None)
+@patch("swarms.structs.flow.asyncio.sleep", new_callable=AsyncMock)
 def test_stopping_token_in_response(mocked_sleep, basic_flow):
     response = basic_flow.run("Test stopping token")
     assert basic_flow.stopping_token in response
@@ -1098,7 +1109,9 @@ def test_flow_agent_history_prompt(flow_instance):
 async def test_flow_run_concurrent(flow_instance):
     # Test running tasks concurrently
     tasks = ["Task 1", "Task 2", "Task 3"]
-    completed_tasks = await flow_instance.run_concurrent(tasks)
+    completed_tasks = [
+        response async for response in flow_instance.run_concurrent(tasks)
+    ]
 
     # Ensure that all tasks are completed
     assert len(completed_tasks) == len(tasks)
@@ -1,30 +1,52 @@
+import time
 from unittest.mock import patch
-from swarms.swarms.god_mode import GodMode, LLM
+from swarms.swarms.god_mode import GodMode
 
 
-def test_godmode_initialization():
-    godmode = GodMode(llms=[LLM] * 5)
-    assert isinstance(godmode, GodMode)
-    assert len(godmode.llms) == 5
+def stub_llm(task):
+    return "response"
 
 
-def test_godmode_run(monkeypatch):
-    def mock_llm_run(self, task):
-        return "response"
+def test_godmode_initialization():
+    with GodMode(llms=[stub_llm] * 5) as godmode:
+        assert isinstance(godmode, GodMode)
+        assert len(godmode.llms) == 5
 
-    monkeypatch.setattr(LLM, "run", mock_llm_run)
-    godmode = GodMode(llms=[LLM] * 5)
-    responses = godmode.run("task1")
+
+def test_godmode_run():
+    with GodMode(llms=[stub_llm] * 5) as godmode:
+        responses = godmode.run("task1")
     assert len(responses) == 5
     assert responses == ["response", "response", "response", "response", "response"]
 
 
 @patch("builtins.print")
-def test_godmode_print_responses(mock_print, monkeypatch):
-    def mock_llm_run(self, task):
+def test_godmode_print_responses(mock_print):
+    with GodMode(llms=[stub_llm] * 5) as godmode:
+        godmode.print_responses("task1")
+    assert mock_print.call_count == 1
+
+
+def test_godmode_run_all_is_concurrent():
+    def slow_llm(task):
+        time.sleep(0.2)
         return "response"
 
-    monkeypatch.setattr(LLM, "run", mock_llm_run)
-    godmode = GodMode(llms=[LLM] * 5)
-    godmode.print_responses("task1")
-    assert mock_print.call_count == 1
+    with GodMode(llms=[slow_llm] * 5) as godmode:
+        start = time.time()
+        responses = godmode.run_all("task1")
+    assert time.time() - start < 5 * 0.2
+    assert responses == ["response"] * 5
+
+
+def test_godmode_run_many_uses_batch():
+    class BatchLLM:
+        def __call__(self, task):
+            raise AssertionError("batch-capable llms should not be called per task")
+
+        def batch(self, tasks):
+            return [f"batched {task}" for task in tasks]
+
+    with GodMode(llms=[BatchLLM(), lambda task: task.upper()]) as godmode:
+        responses = godmode.run_many(["task1", "task2"])
+    assert responses == [["batched task1", "batched task2"], ["TASK1", "TASK2"]]